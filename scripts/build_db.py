@@ -8,11 +8,18 @@ Data sources:
 Run scripts/download_data.sh first to fetch the raw data files.
 
 Usage:
-    python3 scripts/build_db.py
+    python3 scripts/build_db.py [--search-index] [--lookup-table]
+
+The search index and lookup table speed up the Python package, but are left
+out by default: web/public/ingredients.db is a link to the same file, and
+the web app would download them without using them (sql.js has no FTS5).
+The shipped database is built without them, so the package falls back to
+scanning the food tables until it is rebuilt with these options.
 """
 
 from __future__ import annotations
 
+import argparse
 import csv
 import re
 import sqlite3
@@ -28,6 +35,8 @@ except ImportError:
     )
     sys.exit(1)
 
+from rational_recipes.ingredient import build_lookup_table, build_search_index
+
 ROOT = Path(__file__).parent.parent
 DATA_DIR = ROOT / "data"
 FDC_DIR = DATA_DIR / "fdc"
@@ -540,6 +549,22 @@ def load_supplementary(conn: sqlite3.Connection) -> None:
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="build the trigram full-text index used to suggest ingredients"
+        " (needs SQLite with FTS5)",
+    )
+    parser.add_argument(
+        "--lookup-table",
+        action="store_true",
+        help="build the table of ready-made ingredients, one row per synonym",
+    )
+    args = parser.parse_args()
+
     # Check data files exist
     for path, label in [
         (FDC_DIR / "food.csv", "USDA FDC food.csv"),
@@ -580,6 +605,13 @@ def main() -> None:
     fao_count = load_fao_densities(conn)
     print(f"  {fao_count} densities loaded")
 
+    if args.search_index:
+        print("Building suggestion search index...")
+        build_search_index(conn)
+    if args.lookup_table:
+        print("Building ingredient lookup table...")
+        build_lookup_table(conn)
+
     conn.commit()
 
     # Print summary
@@ -16,12 +16,16 @@ import json
 from pathlib import Path
 from typing import Any
 
+import numpy
+import numpy.typing as npt
+
 from rational_recipes.ingredient import Ingredient
 from rational_recipes.statistics import (
     Statistics,
-    calculate_minimum_sample_sizes,
+    batch_statistics,
+    pack_datasets,
 )
-from rational_recipes.utils import get_ratio_and_stats
+from rational_recipes.utils import read_proportions
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_OUTPUT = REPO_ROOT / "artifacts" / "curated_recipes.json"
@@ -137,28 +141,25 @@ def _density_for(ingredient: Ingredient) -> float | None:
 def _build_ingredient_stats(
     ingredients: tuple[Ingredient, ...],
     stats: Statistics,
+    min_sample_sizes: list[int],
 ) -> list[dict[str, Any]]:
     """Convert the pipeline's Statistics object into per-ingredient dicts
     shaped for the CuratedRecipeCatalog schema."""
     bakers = stats.bakers_percentage()
-    min_sample_sizes = list(
-        calculate_minimum_sample_sizes(
-            stats.std_deviations, stats.means, DESIRED_INTERVAL
-        )
-    )
 
     # Means are in "grams per 100g of recipe", so dividing by 100 gives the
-    # 0-1 proportion scale the schema expects. Stddev and CI half-widths
+    # 0-1 proportion scale the schema expects. Stddev and CI widths
     # are in the same units, so they scale the same way.
     result: list[dict[str, Any]] = []
+    widths = stats.interval_widths()
     for i, ing in enumerate(ingredients):
         proportion = stats.means[i] / 100.0
-        half_width = stats.intervals[i] / 100.0
+        below, above = widths[i]
         # Clamp CI lower bound to 0 — the schema requires ci_lower >= 0,
         # and for very sparse ingredients the naive lower bound can dip
         # slightly negative.
-        ci_lower = max(0.0, proportion - half_width)
-        ci_upper = proportion + half_width
+        ci_lower = max(0.0, proportion - below / 100.0)
+        ci_upper = proportion + above / 100.0
         result.append(
             {
                 "name": ing.name(),
@@ -175,12 +176,23 @@ def _build_ingredient_stats(
     return result
 
 
-def _build_recipe(config: dict[str, Any]) -> dict[str, Any]:
-    """Run the pipeline for one recipe config and build its JSON dict."""
+def _read_recipe(
+    config: dict[str, Any],
+) -> tuple[tuple[Ingredient, ...], npt.NDArray[numpy.float64]]:
+    """Read the distinct recipes in grams of one recipe config."""
     csv_paths = [str(REPO_ROOT / f) for f in config["csv_files"]]
-    ingredients, _ratio, stats, sample_size = get_ratio_and_stats(
-        csv_paths, distinct=True, merge=[], zero_columns=None
-    )
+    ingredients, grams, _ = read_proportions(csv_paths, distinct=True, merge=[])
+    return ingredients, grams
+
+
+def _build_recipe(
+    config: dict[str, Any],
+    ingredients: tuple[Ingredient, ...],
+    stats: Statistics,
+    sample_size: int,
+    min_sample_sizes: list[int],
+) -> dict[str, Any]:
+    """Build the JSON dict of one recipe config from its statistics."""
     base_name = ingredients[0].name()
     recipe: dict[str, Any] = {
         "id": config["id"],
@@ -194,7 +206,9 @@ def _build_recipe(config: dict[str, Any]) -> dict[str, Any]:
             "base_ingredient": base_name,
             "sample_size": sample_size,
             "confidence_level": CONFIDENCE_LEVEL,
-            "ingredients": _build_ingredient_stats(ingredients, stats),
+            "ingredients": _build_ingredient_stats(
+                ingredients, stats, min_sample_sizes
+            ),
             "sources": config["sources"],
         }
     )
@@ -214,11 +228,22 @@ def _validate(catalog: dict[str, Any]) -> None:
 
 
 def build_catalog() -> dict[str, Any]:
-    """Run the pipeline for every configured recipe and return the catalog."""
-    return {
-        "version": 1,
-        "recipes": [_build_recipe(cfg) for cfg in RECIPE_CONFIGS],
-    }
+    """Run the pipeline for every configured recipe and return the catalog.
+    The statistics of all recipes are calculated in one batch."""
+    ingredients, datasets = zip(*map(_read_recipe, RECIPE_CONFIGS), strict=True)
+    batch = batch_statistics(*pack_datasets(datasets), DESIRED_INTERVAL)
+    recipes = []
+    for i, config in enumerate(RECIPE_CONFIGS):
+        recipes.append(
+            _build_recipe(
+                config,
+                ingredients[i],
+                batch.statistics(i, ingredients[i]),
+                int(batch.sample_sizes[i]),
+                batch.min_sample_sizes[batch.columns(i)].tolist(),
+            )
+        )
+    return {"version": 1, "recipes": recipes}
 
 
 def main() -> None:
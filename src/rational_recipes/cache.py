@@ -0,0 +1,161 @@
+"""On-disk cache of input files converted to grams.
+
+Parsing and unit conversion dominate the cost of a run, and the same input
+files are often analyzed over and over. Each file's gram matrix is stored in
+NumPy's binary .npz format under a key derived from the file contents, the
+ingredient database, the registered ingredients and the unit table, so that
+any change to one of those yields a new key and the file is parsed again.
+
+The cache is a best effort: entries that cannot be read are parsed again,
+and entries that cannot be written are skipped with a warning. Once the
+entries take more than CACHE_SIZE_LIMIT bytes, the least recently used ones
+are removed.
+"""
+
+import functools
+import hashlib
+import os
+import tempfile
+import warnings
+import zipfile
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy
+import numpy.typing as npt
+
+from rational_recipes.ingredient import Factory as IngredientFactory
+from rational_recipes.ingredient import Ingredient, db_fingerprint
+from rational_recipes.normalize import measures_to_grams
+from rational_recipes.read import (
+    combine_files,
+    map_files,
+    read_ingredients_from_header,
+    read_measure_rows,
+    split_header_and_rows,
+)
+from rational_recipes.units import Factory as UnitFactory
+
+CACHE_VERSION = 1
+
+# Total size in bytes of the entries kept in a cache directory
+CACHE_SIZE_LIMIT = 2**30
+
+
+def default_cache_dir() -> Path:
+    """Cache directory given by $RATIONAL_RECIPES_CACHE, otherwise a
+    directory under the user's cache home"""
+    if "RATIONAL_RECIPES_CACHE" in os.environ:
+        return Path(os.environ["RATIONAL_RECIPES_CACHE"])
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "rational_recipes"
+
+
+def cache_key(file_contents: bytes) -> str:
+    """Key for the cached gram matrix of a file with the given contents"""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    digest.update(db_fingerprint().encode())
+    digest.update(IngredientFactory.fingerprint().encode())
+    digest.update(UnitFactory.fingerprint().encode())
+    digest.update(hashlib.sha256(file_contents).digest())
+    return digest.hexdigest()
+
+
+def _load(path: Path) -> tuple[str, npt.NDArray[numpy.float64]] | None:
+    """Load a cache entry, or None if it is missing or unreadable"""
+    try:
+        with numpy.load(path, allow_pickle=False) as cached:
+            entry = str(cached["header"]), cached["grams"]
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
+    # Mark the entry as recently used, so that pruning keeps it
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+
+def _store(path: Path, header: str, grams: npt.NDArray[numpy.float64]) -> None:
+    """Write a cache entry atomically so that concurrent readers never see
+    a partially written file. A failure to write only gives a warning."""
+    tmp_name = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp_file:
+            tmp_name = tmp_file.name
+            numpy.savez(tmp_file, header=numpy.array(header), grams=grams)
+        os.replace(tmp_name, path)
+    except OSError as e:
+        warnings.warn(
+            f"Could not write cache entry {path}: {e}", RuntimeWarning, stacklevel=2
+        )
+        if tmp_name is not None:
+            Path(tmp_name).unlink(missing_ok=True)
+        return
+    prune_cache(path.parent)
+
+
+def prune_cache(cache_dir: Path, size_limit: int | None = None) -> None:
+    """Remove the least recently used entries of a cache directory until
+    the rest take at most size_limit bytes (default CACHE_SIZE_LIMIT)"""
+    if size_limit is None:
+        size_limit = CACHE_SIZE_LIMIT
+    entries = []
+    for path in cache_dir.glob("*.npz"):
+        try:
+            info = path.stat()
+        except OSError:
+            continue
+        entries.append((info.st_mtime, info.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= size_limit:
+            break
+        # Another process may have removed the entry already
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+
+
+def load_gram_file(
+    filename: str, cache_dir: Path | None = None
+) -> tuple[str, npt.NDArray[numpy.float64]]:
+    """Parse one input file and convert it to grams, returning its header
+    line with the gram matrix. With a cache directory the result is reused
+    for as long as the file, ingredient database and unit table are
+    unchanged."""
+    file_contents = Path(filename).read_bytes()
+    path = None
+    if cache_dir is not None:
+        path = cache_dir / f"{cache_key(file_contents)}.npz"
+        cached = _load(path)
+        if cached is not None:
+            return cached
+    header, rows = split_header_and_rows(file_contents.decode())
+    ingredients = read_ingredients_from_header(header)
+    measures = read_measure_rows(rows, len(ingredients))
+    grams = measures_to_grams(ingredients, measures)
+    if path is not None:
+        _store(path, header, grams)
+    return header, grams
+
+
+def read_gram_files(
+    filenames: Sequence[str], jobs: int = 1, cache_dir: Path | None = None
+) -> tuple[tuple[Ingredient, ...], npt.NDArray[numpy.float64]]:
+    """Read input files by name into one gram matrix, optionally in parallel
+    (see read.map_files) and through the on-disk cache"""
+    ingredients, matrices = read_gram_matrices(filenames, jobs, cache_dir)
+    return ingredients, numpy.concatenate(matrices)
+
+
+def read_gram_matrices(
+    filenames: Sequence[str], jobs: int = 1, cache_dir: Path | None = None
+) -> tuple[tuple[Ingredient, ...], list[npt.NDArray[numpy.float64]]]:
+    """Read input files by name into a gram matrix per file, as
+    read_gram_files does"""
+    load = functools.partial(load_gram_file, cache_dir=cache_dir)
+    return combine_files(map_files(load, filenames, jobs))
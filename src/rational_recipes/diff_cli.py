@@ -37,6 +37,7 @@ def parse_command_line() -> tuple[
         help="show percentage change instead of percentage difference",
     )
     utils.add_merge_option(parser)
+    utils.add_jobs_option(parser)
     options, args = parser.parse_args()
     merge = utils.parse_column_merge(options.merge)
     if len(args) < 2:
@@ -50,7 +51,13 @@ def run() -> None:
     """Run the diff tool from the command line."""
     first_filename, remaining_filenames, options, merge = parse_command_line()
     try:
-        script = DiffMain(first_filename, remaining_filenames, options.distinct, merge)
+        script = DiffMain(
+            first_filename,
+            remaining_filenames,
+            options.distinct,
+            merge,
+            options.jobs,
+        )
         print(script.main(options.show_percentage_change, options.precision))
     except rational_recipes.errors.InvalidInputException as e:
         print(f"Error: {e}", file=sys.stderr)
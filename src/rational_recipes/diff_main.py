@@ -32,10 +32,11 @@ def get_ratios_to_compare(
     remaining_filenames: list[str],
     distinct: bool,
     merge: list[list[tuple[str | int, float]]],
+    jobs: int = 1,
 ) -> tuple[Ratio, Ratio]:
     """Get ratios to compare from input files"""
-    ingredients1, ratio1 = utils.get_ratio(first_filename, distinct, merge)
-    ingredients2, ratio2 = utils.get_ratio(remaining_filenames, distinct, merge)
+    ingredients1, ratio1 = utils.get_ratio(first_filename, distinct, merge, jobs)
+    ingredients2, ratio2 = utils.get_ratio(remaining_filenames, distinct, merge, jobs)
     if ingredients1 != ingredients2:
         raise InvalidInputException(
             "Ingredients for input files do not match: unable to compare"
@@ -52,11 +53,12 @@ class DiffMain:
         remaining_filenames: list[str],
         distinct: bool,
         merge: list[list[tuple[str | int, float]]],
+        jobs: int = 1,
     ) -> None:
         self.number_template = "%%0.%df"
         self.formatter = RatioFormatter()
         self.ratio1, self.ratio2 = get_ratios_to_compare(
-            first_filename, remaining_filenames, distinct, merge
+            first_filename, remaining_filenames, distinct, merge, jobs
         )
 
     def main(self, show_percentage_change: bool, precision: int) -> DiffResult:
@@ -0,0 +1,125 @@
+"""Incremental statistics for input files that grow by appended rows.
+
+The recipe collection pipeline appends rows to one CSV file per dish
+variant. Rather than parsing such a file from the first line on every
+recompute, the reader remembers how far into each file it has read and
+folds only the newly appended rows into running statistics. A file that
+has been truncated or rewritten is parsed again from the start.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import BinaryIO
+
+from rational_recipes.ingredient import Ingredient
+from rational_recipes.merge import Merge
+from rational_recipes.normalize import measures_to_grams, normalize_matrix_to_100g
+from rational_recipes.read import read_ingredients_from_header, read_measure_rows
+from rational_recipes.statistics import Statistics, StatsAccumulator
+
+# Number of bytes at the start of the file, and before the last read
+# position, that must be unchanged for appended rows to be read on their own
+CHECK_SIZE = 256
+
+
+@dataclass
+class TailState:
+    """How far into one file rows have been read, with the statistics of
+    every row read so far"""
+
+    offset: int = 0
+    rows: int = 0
+    head: bytes = b""
+    tail: bytes = b""
+    ingredients: tuple[Ingredient, ...] | None = None
+    accumulator: StatsAccumulator | None = None
+    merger: Merge | None = field(default=None, repr=False)
+
+    def statistics(self) -> Statistics:
+        """Statistics for every row read so far"""
+        assert self.ingredients is not None and self.accumulator is not None
+        ingredients = self.ingredients
+        if self.merger is not None:
+            ingredients = self.merger.merge_ingredients(ingredients)
+        return self.accumulator.statistics(ingredients)
+
+
+class TailReader:
+    """Reads rows appended to input files since the previous update"""
+
+    def __init__(self, merge: list[list[tuple[str | int, float]]] | None = None):
+        self.merge = merge
+        self.files: dict[str, TailState] = {}
+
+    def update(self, filename: str) -> TailState:
+        """Fold rows appended since the last update into the statistics for
+        the file. Only complete lines are read, so a row that is still being
+        written is picked up by the next update."""
+        state = self.files.get(filename)
+        with open(filename, "rb") as input_file:
+            if state is None or _rewritten(input_file, state):
+                state = TailState()
+                self.files[filename] = state
+            input_file.seek(state.offset)
+            data = input_file.read()
+        complete = data[: data.rfind(b"\n") + 1]
+        if len(complete) > 0:
+            self._read_lines(state, complete.decode())
+            if state.offset == 0:
+                state.head = complete[:CHECK_SIZE]
+            state.offset += len(complete)
+            state.tail = (state.tail + complete)[-CHECK_SIZE:]
+        return state
+
+    def _read_lines(self, state: TailState, text: str) -> None:
+        """Parse complete lines and add their rows to the statistics. The
+        state only changes once every line has parsed, so after an error the
+        same lines are read again by the next update."""
+        lines = [line.strip() for line in text.splitlines() if len(line.strip()) > 0]
+        ingredients, merger, accumulator = (
+            state.ingredients,
+            state.merger,
+            state.accumulator,
+        )
+        if ingredients is None:
+            if len(lines) == 0:
+                return
+            ingredients, merger, accumulator = self._read_header(lines.pop(0))
+        assert accumulator is not None
+        if len(lines) > 0:
+            first_line_nr = state.rows + 2
+            measures = read_measure_rows(lines, len(ingredients), first_line_nr)
+            grams = measures_to_grams(ingredients, measures, first_line_nr)
+            if merger is not None:
+                grams = merger.merge_matrix(grams)
+            accumulator.add_batch(normalize_matrix_to_100g(grams))
+        state.ingredients, state.merger, state.accumulator = (
+            ingredients,
+            merger,
+            accumulator,
+        )
+        state.rows += len(lines)
+
+    def _read_header(
+        self, header: str
+    ) -> tuple[tuple[Ingredient, ...], Merge | None, StatsAccumulator]:
+        """Resolve the ingredients of a file and start its statistics"""
+        ingredients = read_ingredients_from_header(header)
+        merger = None
+        merged = ingredients
+        if self.merge:
+            merger = Merge(self.merge, ingredients)
+            merged = merger.merge_ingredients(ingredients)
+        return ingredients, merger, StatsAccumulator(len(merged))
+
+
+def _rewritten(input_file: BinaryIO, state: TailState) -> bool:
+    """True if the file no longer starts with the bytes read earlier, or if
+    it has been truncated or altered before the last read position"""
+    size = os.fstat(input_file.fileno()).st_size
+    if size < state.offset:
+        return True
+    if input_file.read(len(state.head)) != state.head:
+        return True
+    input_file.seek(state.offset - len(state.tail))
+    return input_file.read(len(state.tail)) != state.tail
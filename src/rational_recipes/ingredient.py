@@ -10,11 +10,37 @@ See scripts/build_db.py for the database build pipeline.
 
 from __future__ import annotations
 
+import hashlib
+import itertools
+import json
 import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import NamedTuple
 
 _DB_PATH = Path(__file__).parent / "data" / "ingredients.db"
 
+# Full-text (trigram) index of food names and synonyms, see build_search_index
+SEARCH_TABLE = "food_search"
+
+# Ready-made ingredients by lowercase synonym, see build_lookup_table
+LOOKUP_TABLE = "ingredient_lookup"
+
+# Bytes of the database file each connection may memory map
+MMAP_SIZE = 64 * 1024 * 1024
+
+# Number of ingredients loaded from the database that are kept in memory
+INGREDIENT_CACHE_SIZE = 4096
+
+# Number of unknown names whose suggestions are remembered
+MISS_CACHE_SIZE = 1024
+
+# Digest of the database file, keyed by its modification time and size
+_DB_FINGERPRINT: dict[tuple[int, int], str] = {}
+
 # Portion unit names that represent whole-unit sizes (not volume measures).
 # Used to filter portion data into wholeunits2grams mappings.
 _VOLUME_UNITS = frozenset(
@@ -44,29 +70,138 @@ def _is_volume_or_weight_unit(unit_name: str) -> bool:
     return False
 
 
+def db_fingerprint() -> str:
+    """Digest of the ingredient database contents. The file is only hashed
+    again when its modification time or size changes."""
+    stat = _DB_PATH.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    digest = _DB_FINGERPRINT.get(key)
+    if digest is None:
+        digest = hashlib.sha256(_DB_PATH.read_bytes()).hexdigest()
+        _DB_FINGERPRINT.clear()
+        _DB_FINGERPRINT[key] = digest
+    return digest
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a read-only connection to the ingredient database"""
+    conn = sqlite3.connect(f"{_DB_PATH.as_uri()}?mode=ro", uri=True)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+def _table_names(conn: sqlite3.Connection) -> frozenset[str]:
+    """Names of the tables in a database"""
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return frozenset(row[0] for row in rows)
+
+
+class IngredientCacheInfo(NamedTuple):
+    """Statistics of the ingredient cache. Sizes count ingredients, not
+    names, and leave out registered ingredients."""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class MissCacheInfo(NamedTuple):
+    """Statistics of the cache of unknown ingredient names"""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
 class Factory:
     """Factory and registry for ingredient instances.
 
-    Looks up ingredients from a SQLite database, with an in-memory cache.
+    Looks up ingredients from a SQLite database, with an in-memory cache of
+    the most recently used ingredients. Registered ingredients are never
+    evicted from the cache. Unknown names are remembered too, with their
+    suggestions. When a lookup reaches the database and finds that it has
+    changed, e.g. been rebuilt, everything read from it is forgotten. Each
+    thread queries the database through its own connection, and the caches
+    are updated under a lock, so lookups can be made from several threads.
     """
 
     _INGREDIENTS: dict[str, Ingredient] = {}
-    _conn: sqlite3.Connection | None = None
+    # Ingredients loaded from the database, least recently used first, with
+    # the names they are cached under
+    _RECENT: OrderedDict[Ingredient, list[str]] = OrderedDict()
+    _PINNED: set[str] = set()
+    # Registered ingredients, in the order they were registered
+    _REGISTERED: list[Ingredient] = []
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+    _MISSES: OrderedDict[str, tuple[str, ...]] = OrderedDict()
+    # Fingerprint of the database the caches and connections were read
+    # from, and a count of the changes seen, to reopen connections by
+    _db_fingerprint: str | None = None
+    _generation = 0
+    _miss_hits = 0
+    _miss_count = 0
+    _local = threading.local()
+    _lock = threading.RLock()
+    _snapshot: FoodData | None = None
+    _suggestion_names: list[str] = []
 
     @classmethod
     def _get_conn(cls) -> sqlite3.Connection:
-        if cls._conn is None:
-            cls._conn = sqlite3.connect(
-                str(_DB_PATH),
-                check_same_thread=False,
-            )
-        return cls._conn
+        """The database connection of the current thread"""
+        conn: sqlite3.Connection | None = getattr(cls._local, "conn", None)
+        if conn is None or cls._local.generation != cls._generation:
+            if conn is not None:
+                conn.close()
+            conn = cls._local.conn = _connect()
+            cls._local.tables = _table_names(conn)
+            cls._local.generation = cls._generation
+        return conn
+
+    @classmethod
+    def _has_table(cls, name: str) -> bool:
+        """True if the database has an optional table, such as the search
+        index, built by scripts/build_db.py"""
+        cls._get_conn()
+        tables: frozenset[str] = cls._local.tables
+        return name in tables
 
     @classmethod
     def register(cls, ingredient: Ingredient) -> None:
-        """Register ingredient name and synonyms (for backward compat)"""
-        for name in ingredient.synonyms():
-            cls._INGREDIENTS[name.lower().strip()] = ingredient
+        """Register ingredient name and synonyms (for backward compat).
+        Registered names are never evicted from the cache."""
+        with cls._lock:
+            cls._REGISTERED.append(ingredient)
+            cls._RECENT.pop(ingredient, None)
+            for name in ingredient.synonyms():
+                key = name.lower().strip()
+                cls._INGREDIENTS[key] = ingredient
+                cls._PINNED.add(key)
+                cls._MISSES.pop(key, None)
+
+    @classmethod
+    def registered(cls) -> list[Ingredient]:
+        """Registered ingredients, in the order they were registered, so
+        that registering them again elsewhere gives the same names"""
+        with cls._lock:
+            return list(cls._REGISTERED)
+
+    @classmethod
+    def fingerprint(cls) -> str:
+        """Digest of every registered ingredient with the names it is
+        registered under, used with db_fingerprint to detect when cached
+        conversions are stale"""
+        digest = hashlib.sha256()
+        with cls._lock:
+            for key in sorted(cls._PINNED):
+                ingredient = cls._INGREDIENTS.get(key)
+                description = (key, sorted(vars(ingredient).items()))
+                digest.update(repr(description).encode())
+        return digest.hexdigest()
 
     @classmethod
     def get_by_name(cls, name: str) -> Ingredient:
@@ -78,29 +213,173 @@ class Factory:
         key = name.lower().strip()
 
         # Check cache first
-        if key in cls._INGREDIENTS:
-            return cls._INGREDIENTS[key]
+        ingredient = cls._cached(key)
+        if ingredient is not None:
+            return ingredient
+
+        suggestions = cls._cached_miss(key)
+        if suggestions is None:
+            # Query the database
+            ingredient = cls._load_from_db(key)
+            if ingredient is not None:
+                return ingredient
+            suggestions = tuple(cls._suggest(key))
+            cls._cache_miss(key, suggestions)
+
+        if suggestions:
+            hint = "\n".join(f"  - {s}" for s in suggestions)
+            raise KeyError(f"{name!r}. Did you mean:\n{hint}")
+        raise KeyError(key)
+
+    @classmethod
+    def get_cached(cls, name: str) -> Ingredient | None:
+        """Lookup an Ingredient instance by name in the in-memory cache
+        only, never querying the database. Returns None if it is not
+        cached."""
+        return cls._cached(name.lower().strip())
+
+    @classmethod
+    def _cached(cls, key: str) -> Ingredient | None:
+        """The cached ingredient for a name, marked as recently used"""
+        with cls._lock:
+            ingredient = cls._INGREDIENTS.get(key)
+            if ingredient is not None:
+                cls._hits += 1
+                if ingredient in cls._RECENT:
+                    cls._RECENT.move_to_end(ingredient)
+            return ingredient
+
+    @classmethod
+    def _cache(cls, ingredient: Ingredient) -> None:
+        """Cache an ingredient under all its synonyms, evicting the least
+        recently used ingredients when the cache is full. Called with the
+        lock held."""
+        keys = [syn.lower().strip() for syn in ingredient.synonyms()]
+        keys = [key for key in keys if key not in cls._PINNED]
+        for key in keys:
+            cls._INGREDIENTS[key] = ingredient
+        cls._RECENT[ingredient] = keys
+        while len(cls._RECENT) > INGREDIENT_CACHE_SIZE:
+            evicted, evicted_keys = cls._RECENT.popitem(last=False)
+            for key in evicted_keys:
+                # Unless the name now belongs to another ingredient
+                if cls._INGREDIENTS.get(key) is evicted:
+                    del cls._INGREDIENTS[key]
+            cls._evictions += 1
+
+    @classmethod
+    def cache_info(cls) -> IngredientCacheInfo:
+        """Hits and misses of the ingredient cache. Misses count the names
+        looked up in the database."""
+        return IngredientCacheInfo(
+            cls._hits,
+            cls._misses,
+            cls._evictions,
+            INGREDIENT_CACHE_SIZE,
+            len(cls._RECENT),
+        )
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Forget the ingredients loaded from the database, keeping the
+        registered ones, and reset the statistics"""
+        with cls._lock:
+            cls._forget_loaded()
+            cls._hits = 0
+            cls._misses = 0
+            cls._evictions = 0
+
+    @classmethod
+    def _forget_loaded(cls) -> None:
+        """Drop the ingredients loaded from the database from the cache.
+        Called with the lock held."""
+        for ingredient, keys in cls._RECENT.items():
+            for key in keys:
+                if cls._INGREDIENTS.get(key) is ingredient:
+                    del cls._INGREDIENTS[key]
+        cls._RECENT.clear()
+
+    @classmethod
+    def _check_database(cls) -> None:
+        """If the database has changed since it was last read, forget the
+        ingredients and unknown names read from it, and have each thread
+        reopen its connection before its next query"""
+        fingerprint = db_fingerprint()
+        with cls._lock:
+            if fingerprint == cls._db_fingerprint:
+                return
+            if cls._db_fingerprint is not None:
+                cls._forget_loaded()
+                cls._generation += 1
+            cls._MISSES.clear()
+            cls._db_fingerprint = fingerprint
+
+    @classmethod
+    def _cached_miss(cls, key: str) -> tuple[str, ...] | None:
+        """Suggestions for a name known not to be in the database, or None
+        if the name has not been looked up since the database last changed.
+        """
+        cls._check_database()
+        with cls._lock:
+            suggestions = cls._MISSES.get(key)
+            if suggestions is not None:
+                cls._MISSES.move_to_end(key)
+                cls._miss_hits += 1
+            return suggestions
 
-        # Query the database
-        ingredient = cls._load_from_db(key)
-        if ingredient is None:
-            suggestions = cls._suggest(key)
-            if suggestions:
-                hint = "\n".join(f"  - {s}" for s in suggestions)
-                raise KeyError(f"{name!r}. Did you mean:\n{hint}")
-            raise KeyError(key)
+    @classmethod
+    def _cache_miss(cls, key: str, suggestions: tuple[str, ...]) -> None:
+        """Remember that a name is not in the database, evicting the least
+        recently used name when the cache is full."""
+        with cls._lock:
+            cls._MISSES[key] = suggestions
+            cls._miss_count += 1
+            if len(cls._MISSES) > MISS_CACHE_SIZE:
+                cls._MISSES.popitem(last=False)
 
-        cls._INGREDIENTS[key] = ingredient
-        return ingredient
+    @classmethod
+    def miss_cache_info(cls) -> MissCacheInfo:
+        """Hits and misses of the unknown name cache. Misses count the
+        unknown names that had to be searched for in the database."""
+        return MissCacheInfo(
+            cls._miss_hits, cls._miss_count, MISS_CACHE_SIZE, len(cls._MISSES)
+        )
+
+    @classmethod
+    def clear_miss_cache(cls) -> None:
+        """Forget unknown names and reset the statistics"""
+        with cls._lock:
+            cls._MISSES.clear()
+            cls._miss_hits = 0
+            cls._miss_count = 0
 
     @classmethod
     def _suggest(cls, name: str, limit: int = 5) -> list[str]:
-        """Search for foods whose name or synonym contains all query words."""
-        conn = cls._get_conn()
+        """Search for foods whose name or synonym contains all query words.
+
+        Uses the trigram index built by scripts/build_db.py when the database
+        has one, ranking matches by relevance. Otherwise falls back to
+        scanning the food and synonym tables.
+        """
         words = name.lower().split()
         if not words:
             return []
 
+        suggestion_names = cls._suggestion_names
+        if suggestion_names:
+            # Snapshot names are sorted by length, as for the query below
+            matches = (
+                candidate
+                for candidate in suggestion_names
+                if all(word in candidate.lower() for word in words)
+            )
+            return list(itertools.islice(matches, limit))
+        conn = cls._get_conn()
+        # Trigram queries need at least three characters
+        indexed_words = [word for word in words if len(word) >= 3]
+        if indexed_words and cls._has_table(SEARCH_TABLE):
+            return _search_index(conn, words, indexed_words, limit)
+
         # Search both food names and synonyms
         conditions = " AND ".join("name LIKE ?" for _ in words)
         params = [f"%{w}%" for w in words]
@@ -118,89 +397,328 @@ class Factory:
 
         return [r[0] for r in rows]
 
+    @classmethod
+    def get_many(cls, names: Sequence[str]) -> tuple[Ingredient, ...]:
+        """Lookup several Ingredient instances by name, e.g. all columns of
+        an input file header.
+
+        Names missing from the in-memory cache are loaded together, with a
+        single query per table, skipping names already known to be missing.
+        Raises KeyError for the first name that is not found, exactly as
+        get_by_name does.
+        """
+        keys = [name.lower().strip() for name in names]
+        missing = [
+            key
+            for key in dict.fromkeys(keys)
+            if key not in cls._INGREDIENTS and key not in cls._MISSES
+        ]
+        loaded = cls._load_many_from_db(missing) if missing else {}
+        return tuple(
+            loaded[key] if key in loaded else cls.get_by_name(name)
+            for name, key in zip(names, keys, strict=True)
+        )
+
     @classmethod
     def _load_from_db(cls, name: str) -> Ingredient | None:
         """Load an ingredient from the SQLite database by synonym lookup."""
-        conn = cls._get_conn()
-
-        # Find the food via synonym
-        row = conn.execute(
-            "SELECT f.id, f.name "
-            "FROM synonym s JOIN food f ON f.id = s.food_id "
-            "WHERE s.name = ? COLLATE NOCASE",
-            (name,),
-        ).fetchone()
+        return cls._load_many_from_db([name]).get(name)
 
-        if row is None:
-            return None
+    @classmethod
+    def _load_many_from_db(cls, names: list[str]) -> dict[str, Ingredient]:
+        """Load ingredients for several lowercase names from the SQLite
+        database (or the snapshot, if loaded). Reads the lookup table if the
+        database has one, or else makes one query per table. Names that are
+        not found are left out of the result."""
+        cls._check_database()
+        data = cls._snapshot
+        if data is None and cls._has_table(LOOKUP_TABLE):
+            built = _read_lookup_table(cls._get_conn(), names)
+        else:
+            if data is None:
+                data = _read_food_data(cls._get_conn(), names)
+            built = {}
+            for name in names:
+                if name in data.foods:
+                    food_id, food_name = data.foods[name]
+                    built[name] = _build_ingredient(
+                        name,
+                        food_name,
+                        data.densities.get(food_id, []),
+                        data.synonyms.get(food_id, []),
+                        data.portions.get(food_id, []),
+                    )
+
+        loaded: dict[str, Ingredient] = {}
+        # Under the lock, so that concurrent loads of the same food share
+        # one instance
+        with cls._lock:
+            cls._misses += len(names)
+            for name in names:
+                if name not in built:
+                    continue
+                if name in cls._INGREDIENTS:
+                    # Already cached as a synonym of an earlier name, or by
+                    # another thread
+                    loaded[name] = cls._INGREDIENTS[name]
+                    continue
+                cls._cache(built[name])
+                loaded[name] = built[name]
+        return loaded
 
-        food_id: int = row[0]
-        food_name: str = row[1]
+    @classmethod
+    def load_snapshot(cls) -> None:
+        """Load the synonym, density and portion data of every food into
+        memory. From then on ingredients are looked up without querying the
+        database, which suits long running jobs resolving many names."""
+        data = _read_food_data(cls._get_conn(), None)
+        names = {food_name for _, food_name in data.foods.values()}
+        for synonyms in data.synonyms.values():
+            names.update(synonyms)
+        with cls._lock:
+            cls._suggestion_names = sorted(names, key=len)
+            cls._snapshot = data
 
-        # Get density (prefer fdc_derived, then supplementary, then fao)
-        density_rows = conn.execute(
-            "SELECT g_per_ml, source FROM density WHERE food_id = ? "
-            "ORDER BY CASE source "
+    @classmethod
+    def drop_snapshot(cls) -> None:
+        """Go back to querying the database for each uncached name"""
+        with cls._lock:
+            cls._snapshot = None
+            cls._suggestion_names = []
+
+
+@dataclass
+class FoodData:
+    """Database rows for a set of foods. Foods are keyed by lowercase
+    synonym, and the remaining rows are grouped by food id."""
+
+    foods: dict[str, tuple[int, str]] = field(default_factory=dict)
+    densities: dict[int, list[tuple[float, str]]] = field(default_factory=dict)
+    synonyms: dict[int, list[str]] = field(default_factory=dict)
+    portions: dict[int, list[tuple[str, float]]] = field(default_factory=dict)
+
+
+def _read_food_data(conn: sqlite3.Connection, names: list[str] | None) -> FoodData:
+    """Read the foods for a list of lowercase synonyms, or for every synonym
+    if names is None, with one query per table."""
+    data = FoodData()
+    # Find the foods via synonyms
+    query = "SELECT s.name, f.id, f.name FROM synonym s JOIN food f ON f.id = s.food_id"
+    if names is None:
+        rows = conn.execute(query).fetchall()
+    else:
+        rows = []
+        for name_chunk in _chunks(names):
+            rows += conn.execute(
+                f"{query} WHERE s.name COLLATE NOCASE IN ({_placeholders(name_chunk)})",
+                name_chunk,
+            ).fetchall()
+    for synonym, food_id, food_name in rows:
+        data.foods[synonym.lower()] = (food_id, food_name)
+
+    conditions: list[tuple[str, list[int]]] = [("", [])]
+    if names is not None:
+        food_ids = sorted({food_id for food_id, _ in data.foods.values()})
+        conditions = [
+            (f"WHERE food_id IN ({_placeholders(chunk)})", chunk)
+            for chunk in _chunks(food_ids)
+        ]
+    for condition, params in conditions:
+        # Get densities (prefer fdc_derived, then supplementary, then fao)
+        for food_id, g_per_ml, source in conn.execute(
+            f"SELECT food_id, g_per_ml, source FROM density {condition} "
+            "ORDER BY food_id, CASE source "
             "  WHEN 'fdc_derived' THEN 1 "
             "  WHEN 'supplementary' THEN 2 "
             "  ELSE 3 "
-            "END",
-            (food_id,),
-        ).fetchall()
-
-        if density_rows:
-            density = density_rows[0][0]
-            density_src = density_rows[0][1]
-            density_alts = [(val, src) for val, src in density_rows]
-        else:
-            density = 1.0
-            density_src = "default"
-            density_alts = []
-
-        # Get all synonyms for this food
-        synonym_rows = conn.execute(
-            "SELECT name FROM synonym WHERE food_id = ?",
-            (food_id,),
-        ).fetchall()
-        all_names = [r[0] for r in synonym_rows]
-
-        # Build names list: lookup name first, then other short aliases,
-        # excluding the verbose FDC description.
-        short_names = [n for n in all_names if n != food_name and n.lower() != name]
-        names = [name] + short_names
-
+            "END, id",
+            params,
+        ):
+            data.densities.setdefault(food_id, []).append((g_per_ml, source))
+        # Get all synonyms for the foods
+        for food_id, synonym in conn.execute(
+            f"SELECT food_id, name FROM synonym {condition} ORDER BY id", params
+        ):
+            data.synonyms.setdefault(food_id, []).append(synonym)
         # Get portion data (for whole-unit conversions)
-        portion_rows = conn.execute(
-            "SELECT unit_name, gram_weight FROM portion WHERE food_id = ?",
-            (food_id,),
-        ).fetchall()
-
-        wholeunits: dict[str, float] = {}
-        default_wholeunit: str | None = None
-
-        for unit_name, gram_weight in portion_rows:
-            if not _is_volume_or_weight_unit(unit_name):
-                wholeunits[unit_name] = gram_weight
-
-        # Determine default whole unit
-        lower_units = {k.lower(): k for k in wholeunits}
-        if "medium" in lower_units:
-            default_wholeunit = lower_units["medium"]
-
-        ingredient = Ingredient(
-            names=names,
-            conversion=density,
-            density_source=density_src,
-            density_alternatives=density_alts,
-            wholeunits2weight=wholeunits if wholeunits else None,
-            default_wholeunit_weight=default_wholeunit,
+        for food_id, unit_name, gram_weight in conn.execute(
+            f"SELECT food_id, unit_name, gram_weight FROM portion {condition} "
+            "ORDER BY id",
+            params,
+        ):
+            data.portions.setdefault(food_id, []).append((unit_name, gram_weight))
+    return data
+
+
+def build_search_index(conn: sqlite3.Connection) -> None:
+    """Build the trigram full-text index of food names and synonyms used to
+    suggest foods for unknown names. Run by scripts/build_db.py
+    --search-index once the food and synonym tables are loaded."""
+    conn.executescript(
+        f"DROP TABLE IF EXISTS {SEARCH_TABLE};"
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(name, tokenize = 'trigram');"
+        f"INSERT INTO {SEARCH_TABLE} (name) "
+        "  SELECT name FROM food UNION SELECT name FROM synonym;"
+    )
+
+
+def build_lookup_table(conn: sqlite3.Connection) -> None:
+    """Build the table of ready-made ingredients, one row per lowercase
+    synonym, with the density and whole unit data already chosen. Lookups
+    then need a single query. Run by scripts/build_db.py --lookup-table
+    once the food tables are loaded."""
+    data = _read_food_data(conn, None)
+    rows = []
+    for name, (food_id, food_name) in data.foods.items():
+        names, density, source, alternatives, wholeunits, default = _ingredient_args(
+            name,
+            food_name,
+            data.densities.get(food_id, []),
+            data.synonyms.get(food_id, []),
+            data.portions.get(food_id, []),
         )
-
-        # Cache all synonyms
-        for syn in names:
-            cls._INGREDIENTS[syn.lower().strip()] = ingredient
-
-        return ingredient
+        rows.append(
+            (
+                name,
+                json.dumps(names),
+                density,
+                source,
+                json.dumps(alternatives),
+                None if wholeunits is None else json.dumps(wholeunits),
+                default,
+            )
+        )
+    conn.executescript(
+        f"DROP TABLE IF EXISTS {LOOKUP_TABLE};"
+        f"CREATE TABLE {LOOKUP_TABLE} ("
+        "  name TEXT PRIMARY KEY,"
+        "  names TEXT NOT NULL,"
+        "  density REAL NOT NULL,"
+        "  density_source TEXT NOT NULL,"
+        "  density_alternatives TEXT NOT NULL,"
+        "  wholeunits TEXT,"
+        "  default_wholeunit TEXT"
+        ") WITHOUT ROWID;"
+    )
+    conn.executemany(f"INSERT INTO {LOOKUP_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def _read_lookup_table(
+    conn: sqlite3.Connection, names: list[str]
+) -> dict[str, Ingredient]:
+    """Read ingredients for a list of lowercase synonyms from the lookup
+    table. Names that are not found are left out of the result."""
+    ingredients: dict[str, Ingredient] = {}
+    for name_chunk in _chunks(names):
+        rows = conn.execute(
+            f"SELECT * FROM {LOOKUP_TABLE} WHERE name IN ({_placeholders(name_chunk)})",
+            name_chunk,
+        )
+        for name, synonyms, density, source, alternatives, wholeunits, default in rows:
+            ingredients[name] = Ingredient(
+                names=json.loads(synonyms),
+                conversion=density,
+                density_source=source,
+                density_alternatives=[tuple(alt) for alt in json.loads(alternatives)],
+                wholeunits2weight=None
+                if wholeunits is None
+                else json.loads(wholeunits),
+                default_wholeunit_weight=default,
+            )
+    return ingredients
+
+
+def _search_index(
+    conn: sqlite3.Connection, words: list[str], indexed_words: list[str], limit: int
+) -> list[str]:
+    """Find names containing every word, best match (bm25) first. Words too
+    short for the trigram index are matched with LIKE on the candidates."""
+    expression = " AND ".join(
+        '"' + word.replace('"', '""') + '"' for word in indexed_words
+    )
+    short_words = [word for word in words if word not in indexed_words]
+    conditions = "".join(" AND name LIKE ?" for _ in short_words)
+    rows = conn.execute(
+        f"SELECT name FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ?{conditions} "
+        "ORDER BY rank, length(name) LIMIT ?",
+        [expression] + [f"%{word}%" for word in short_words] + [limit],
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _chunks[T](values: Sequence[T], size: int = 500) -> list[list[T]]:
+    """Split query parameters into chunks below SQLite's variable limit"""
+    return [list(values[i : i + size]) for i in range(0, len(values), size)]
+
+
+def _placeholders(values: Sequence[object]) -> str:
+    """Parameter placeholders for an SQL IN list"""
+    return ", ".join("?" for _ in values)
+
+
+# Arguments of the Ingredient constructor
+type _IngredientArgs = tuple[
+    list[str], float, str, list[tuple[float, str]], dict[str, float] | None, str | None
+]
+
+
+def _build_ingredient(
+    name: str,
+    food_name: str,
+    density_rows: list[tuple[float, str]],
+    all_names: list[str],
+    portion_rows: list[tuple[str, float]],
+) -> Ingredient:
+    """Build an ingredient from the database rows of one food. Density rows
+    are expected in order of source preference."""
+    return Ingredient(
+        *_ingredient_args(name, food_name, density_rows, all_names, portion_rows)
+    )
+
+
+def _ingredient_args(
+    name: str,
+    food_name: str,
+    density_rows: list[tuple[float, str]],
+    all_names: list[str],
+    portion_rows: list[tuple[str, float]],
+) -> _IngredientArgs:
+    """Choose the names, density and whole unit weights of an ingredient from
+    the database rows of one food"""
+    if density_rows:
+        density = density_rows[0][0]
+        density_src = density_rows[0][1]
+        density_alts = list(density_rows)
+    else:
+        density = 1.0
+        density_src = "default"
+        density_alts = []
+
+    # Build names list: lookup name first, then other short aliases,
+    # excluding the verbose FDC description.
+    short_names = [n for n in all_names if n != food_name and n.lower() != name]
+    names = [name] + short_names
+
+    wholeunits: dict[str, float] = {}
+    default_wholeunit: str | None = None
+
+    for unit_name, gram_weight in portion_rows:
+        if not _is_volume_or_weight_unit(unit_name):
+            wholeunits[unit_name] = gram_weight
+
+    # Determine default whole unit
+    lower_units = {k.lower(): k for k in wholeunits}
+    if "medium" in lower_units:
+        default_wholeunit = lower_units["medium"]
+
+    return (
+        names,
+        density,
+        density_src,
+        density_alts,
+        wholeunits if wholeunits else None,
+        default_wholeunit,
+    )
 
 
 class Ingredient:
@@ -288,6 +806,17 @@ class Ingredient:
         else:
             return None
 
+    def __eq__(self, other: object) -> bool:
+        """Ingredients with the same names and conversions are equal, also
+        when loaded separately, e.g. again after being evicted from the
+        cache"""
+        if not isinstance(other, Ingredient):
+            return NotImplemented
+        return vars(self) == vars(other)
+
+    def __hash__(self) -> int:
+        return hash((self._name, self._conversion))
+
     def __repr__(self) -> str:
         return self.name()
 
@@ -20,7 +20,10 @@ This module allows column merging for these situations.
 """
 
 from collections.abc import Callable, Generator, Iterable, Sequence
-from typing import TypeVar
+from typing import Any, TypeVar
+
+import numpy
+import numpy.typing as npt
 
 from rational_recipes.columns import ColumnTranslator
 from rational_recipes.errors import InvalidArgumentException
@@ -126,6 +129,26 @@ class Merge:
         for row in rows:
             yield tuple(self.merge_one_row(row, combine_measurements))
 
+    def merge_matrix[F: numpy.floating[Any]](
+        self, matrix: npt.NDArray[F]
+    ) -> npt.NDArray[F]:
+        """Merge all rows of a measurement matrix with a single matrix
+        product. Each output column is a weighted sum of input columns. The
+        result has the data type and memory layout of the matrix."""
+        nr_columns = matrix.shape[1]
+        combinations = [
+            columns
+            for index in range(nr_columns)
+            if (columns := self.column_index_to_columns[index]) is not None
+        ]
+        weights = numpy.zeros((nr_columns, len(combinations)), dtype=matrix.dtype)
+        for new_index, columns in enumerate(combinations):
+            for column_index, percentage in columns:
+                weights[column_index, new_index] += percentage
+        result = numpy.empty_like(matrix, shape=(len(matrix), len(combinations)))
+        numpy.matmul(matrix, weights, out=result)
+        return result
+
     def merge_ingredients(
         self, ingredients: tuple[Ingredient, ...]
     ) -> tuple[Ingredient, ...]:
@@ -163,3 +186,15 @@ def merge_columns(
     new_rows = list(merger.merge_rows(rows))
     new_ingredients = merger.merge_ingredients(ingredients)
     return new_ingredients, new_rows
+
+
+def merge_matrix_columns[F: numpy.floating[Any]](
+    ingredients: tuple[Ingredient, ...],
+    matrix: npt.NDArray[F],
+    merge: list[list[tuple[str | int, float]]] | None = None,
+) -> tuple[tuple[Ingredient, ...], npt.NDArray[F]]:
+    """Columnar counterpart of merge_columns."""
+    if merge is None or len(merge) == 0:
+        return ingredients, matrix
+    merger = Merge(merge, ingredients)
+    return merger.merge_ingredients(ingredients), merger.merge_matrix(matrix)
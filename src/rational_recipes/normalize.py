@@ -3,10 +3,16 @@
 from __future__ import annotations
 
 from collections.abc import Generator, Iterable, Sequence
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
+
+import numpy
+import numpy.typing as npt
+
+from rational_recipes.units import Factory as UnitFactory
 
 if TYPE_CHECKING:
     from rational_recipes.ingredient import Ingredient
+    from rational_recipes.read import MeasureMatrix
     from rational_recipes.units import Unit
 
 
@@ -26,6 +32,43 @@ def to_grams(
         line_nr += 1
 
 
+def conversion_table(
+    ingredients: tuple[Ingredient, ...],
+) -> npt.NDArray[numpy.float64]:
+    """Grams per unit of measure, with a row for each ingredient and a column
+    for each unit code. Units that cannot be used for an ingredient are NaN.
+    """
+    units = UnitFactory.get_all()
+    table = numpy.full((len(ingredients), len(units)), numpy.nan)
+    for row, ingredient in enumerate(ingredients):
+        for unit in units:
+            factor = unit.factor(ingredient)
+            if factor is not None:
+                table[row, unit.code] = factor
+    return table
+
+
+def measures_to_grams(
+    ingredients: tuple[Ingredient, ...],
+    measures: MeasureMatrix,
+    first_line_nr: int = 2,
+) -> npt.NDArray[numpy.float64]:
+    """Columnar counterpart of to_grams. Every unit is a linear conversion, so
+    the whole matrix is converted by looking up each cell's factor in the
+    conversion table of the ingredients and multiplying. When a unit cannot
+    be used for an ingredient the error reports the first offending line."""
+    table = conversion_table(ingredients)
+    factors = table[numpy.arange(len(ingredients)), measures.units]
+    inapplicable = numpy.isnan(factors)
+    if inapplicable.any():
+        row, column = (int(index[0]) for index in numpy.nonzero(inapplicable))
+        unit = UnitFactory.get_by_code(int(measures.units[row, column]))
+        # Raises the error for the unit
+        unit.norm(1.0, ingredients[column], row + first_line_nr)
+    grams: npt.NDArray[numpy.float64] = measures.values * factors
+    return grams
+
+
 def normalize_to_100g(
     rows: Iterable[Sequence[float]],
 ) -> Generator[tuple[float, ...], None, None]:
@@ -33,3 +76,18 @@ def normalize_to_100g(
     for row in rows:
         multiplier = 100 / float(sum(row))
         yield tuple(value * multiplier for value in row)
+
+
+def normalize_matrix_to_100g[F: numpy.floating[Any]](
+    data: npt.NDArray[F],
+    out: npt.NDArray[F] | None = None,
+) -> npt.NDArray[F]:
+    """Array counterpart of normalize_to_100g, scaling every row of a matrix
+    to sum to 100. Pass out=data to normalize in place. Raises
+    ZeroDivisionError for a row of zeros, as normalize_to_100g does."""
+    totals = data.sum(axis=1, keepdims=True)
+    if not totals.all():
+        raise ZeroDivisionError("float division by zero")
+    multipliers = 100 / totals
+    normalized: npt.NDArray[F] = numpy.multiply(data, multipliers, out=out)
+    return normalized
@@ -0,0 +1,216 @@
+"""Quantiles of matrix columns, exact or from a mergeable streaming sketch"""
+
+from collections.abc import Sequence
+from typing import Any
+
+import numpy
+import numpy.typing as npt
+
+QUARTILES = (0.25, 0.5, 0.75)
+
+# Share of the values cut from each end for trimmed means
+TRIM = 0.1
+
+# Capacity of the top level of a sketch (k), which sets its accuracy
+SKETCH_SIZE = 200
+# Each level below the top holds this share of the level above it
+CAPACITY_DECAY = 2 / 3
+# Seed of sketches that should compact the same way on every run
+SKETCH_SEED = 0
+
+
+def exact_quantiles(
+    data: npt.NDArray[numpy.floating[Any]], fractions: Sequence[float]
+) -> npt.NDArray[numpy.floating[Any]]:
+    """Quantiles of each column of a matrix, one row per fraction.
+    numpy.quantile partitions around the ranks needed instead of sorting,
+    so this is O(n)."""
+    quantiles: npt.NDArray[numpy.floating[Any]] = numpy.quantile(
+        data, fractions, axis=0
+    )
+    return quantiles
+
+
+def exact_trimmed_means(
+    data: npt.NDArray[numpy.floating[Any]], trim: float = TRIM
+) -> npt.NDArray[numpy.floating[Any]]:
+    """Mean of each column of a matrix without its trim share of lowest and
+    highest values"""
+    nr_rows = len(data)
+    cut = int(trim * nr_rows)
+    if cut == 0:
+        means: npt.NDArray[numpy.floating[Any]] = data.mean(axis=0, dtype=numpy.float64)
+        return means
+    # Only the two cut points need to be in place, the values between them
+    # are summed in any order
+    ranked = numpy.partition(data, [cut, nr_rows - cut - 1], axis=0)
+    trimmed: npt.NDArray[numpy.floating[Any]] = ranked[cut : nr_rows - cut].mean(
+        axis=0, dtype=numpy.float64
+    )
+    return trimmed
+
+
+def weighted_quantiles(
+    data: npt.NDArray[numpy.floating[Any]],
+    weights: npt.NDArray[numpy.float64],
+    fractions: Sequence[float],
+) -> npt.NDArray[numpy.floating[Any]]:
+    """Quantiles of each column of a matrix with weighted rows, one row per
+    fraction. Each value is placed at the weight of the values below it,
+    relative to that of the largest value, and quantiles are interpolated
+    linearly between these places. With equal weights this is the default
+    method of numpy.quantile. This sorts, so it is O(n log n)."""
+    used = weights > 0
+    if not used.all():
+        data, weights = data[used], weights[used]
+    if len(data) == 1:
+        return numpy.repeat(data, len(fractions), axis=0)
+    values, ranked_weights = _ranked(data, weights)
+    below = ranked_weights.cumsum(axis=0) - ranked_weights
+    places = below / below[-1]
+    targets = numpy.asarray(fractions)[:, numpy.newaxis, numpy.newaxis]
+    upper = (places >= targets).argmax(axis=1)
+    lower = numpy.maximum(upper - 1, 0)
+    low_places = numpy.take_along_axis(places, lower, axis=0)
+    high_places = numpy.take_along_axis(places, upper, axis=0)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        shares = numpy.where(
+            high_places > low_places,
+            (targets[:, 0] - low_places) / (high_places - low_places),
+            1.0,
+        )
+    low_values = numpy.take_along_axis(values, lower, axis=0)
+    high_values = numpy.take_along_axis(values, upper, axis=0)
+    quantiles: npt.NDArray[numpy.floating[Any]] = low_values + shares * (
+        high_values - low_values
+    )
+    return quantiles
+
+
+def weighted_trimmed_means(
+    data: npt.NDArray[numpy.floating[Any]],
+    weights: npt.NDArray[numpy.float64],
+    trim: float = TRIM,
+    nr_rows: int | None = None,
+) -> npt.NDArray[numpy.floating[Any]]:
+    """Weighted mean of each column of a matrix with weighted rows, without
+    the weight of its lowest and highest values. As in exact_trimmed_means,
+    trim of the nr_rows rows the weights stand for, rounded down, is cut
+    from each end, here as the same share of the total weight. By default
+    the rows are those of positive weight, so equal weights give the same
+    means as no weights."""
+    if nr_rows is None:
+        nr_rows = int(numpy.count_nonzero(weights))
+    share = int(trim * nr_rows) / nr_rows
+    values, ranked_weights = _ranked(data, weights)
+    ranks = ranked_weights.cumsum(axis=0)
+    total = ranks[-1]
+    low, high = share * total, (1 - share) * total
+    # The part of each value's weight that falls between the cut points
+    below = ranks - ranked_weights
+    kept = numpy.clip(ranks, low, high) - numpy.clip(below, low, high)
+    means: npt.NDArray[numpy.floating[Any]] = (values * kept).sum(axis=0) / (high - low)
+    return means
+
+
+def _ranked(
+    data: npt.NDArray[numpy.floating[Any]], weights: npt.NDArray[numpy.float64]
+) -> tuple[npt.NDArray[numpy.floating[Any]], npt.NDArray[numpy.float64]]:
+    """Sorted values of each column with the weights of the rows they come
+    from"""
+    order = numpy.argsort(data, axis=0)
+    return numpy.take_along_axis(data, order, axis=0), weights[order]
+
+
+class QuantileSketch:
+    """KLL sketch of each column of a stream of rows, giving approximate
+    quantiles in memory that grows only with the log of the number of rows.
+
+    Values are kept in levels of compactors, each value at level h standing
+    for 2**h rows. When the sketch is over capacity, the lowest full level
+    is sorted and every other value, starting at random, moves up a level.
+    Sketches of separate shards of the data can be merged. Until the first
+    compaction every row is kept and the quantiles are exact.
+    """
+
+    def __init__(
+        self, nr_columns: int, size: int = SKETCH_SIZE, seed: int | None = None
+    ) -> None:
+        self.nr_columns = nr_columns
+        self.size = size
+        self.count = 0
+        self.levels: list[npt.NDArray[numpy.float64]] = [self._empty()]
+        self._rng = numpy.random.default_rng(seed)
+
+    def _empty(self) -> npt.NDArray[numpy.float64]:
+        """A level without values"""
+        return numpy.empty((0, self.nr_columns))
+
+    def _capacity(self, level: int) -> int:
+        """Number of values a level holds before it is compacted"""
+        depth = len(self.levels) - level - 1
+        return max(int(numpy.ceil(self.size * CAPACITY_DECAY**depth)), 2)
+
+    def add_batch(self, rows: npt.NDArray[numpy.float64]) -> None:
+        """Add a matrix of rows"""
+        self.levels[0] = numpy.concatenate([self.levels[0], rows])
+        self.count += len(rows)
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the rows of another sketch, e.g. of another shard"""
+        if other.nr_columns != self.nr_columns:
+            raise ValueError("Cannot merge sketches of different numbers of columns")
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(self._empty())
+            self.levels[level] = numpy.concatenate([self.levels[level], values])
+        self.count += other.count
+        self._compress()
+
+    def _compress(self) -> None:
+        """Compact levels until the sketch is within its capacity"""
+        while sum(map(len, self.levels)) > sum(
+            map(self._capacity, range(len(self.levels)))
+        ):
+            level = next(
+                level
+                for level, values in enumerate(self.levels)
+                if len(values) >= self._capacity(level)
+            )
+            self._compact(level)
+
+    def _compact(self, level: int) -> None:
+        """Move every other sorted value of a level up to the next level"""
+        if level + 1 == len(self.levels):
+            self.levels.append(self._empty())
+        values = numpy.sort(self.levels[level], axis=0)
+        # With an odd number of values, the smallest stays behind
+        odd = len(values) % 2
+        start = odd + int(self._rng.integers(2))
+        self.levels[level] = values[:odd]
+        self.levels[level + 1] = numpy.concatenate(
+            [self.levels[level + 1], values[start::2]]
+        )
+
+    def _weighted(
+        self,
+    ) -> tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.float64]]:
+        """All values kept, with the number of rows each stands for"""
+        weights = numpy.concatenate(
+            [numpy.full(len(level), 2.0**h) for h, level in enumerate(self.levels)]
+        )
+        return numpy.concatenate(self.levels), weights
+
+    def quantiles(self, fractions: Sequence[float]) -> npt.NDArray[numpy.floating[Any]]:
+        """Quantiles of each column, one row per fraction"""
+        if len(self.levels) == 1:
+            return exact_quantiles(self.levels[0], fractions)
+        return weighted_quantiles(*self._weighted(), fractions)
+
+    def trimmed_means(self, trim: float = TRIM) -> npt.NDArray[numpy.floating[Any]]:
+        """Mean of each column without its trim share of lowest and highest
+        values"""
+        if len(self.levels) == 1:
+            return exact_trimmed_means(self.levels[0], trim)
+        return weighted_trimmed_means(*self._weighted(), trim, self.count)
@@ -1,16 +1,23 @@
 """Read and parse input files"""
 
 import csv
+import functools
 import io
 import re
-from collections.abc import Generator, Sequence
+from array import array
+from collections.abc import Callable, Generator, Iterable, Sequence
+from dataclasses import dataclass
 from typing import TextIO
 
+import numpy
+import numpy.typing as npt
+
 from rational_recipes.errors import InvalidInputException
 from rational_recipes.ingredient import Factory as IngredientFactory
 from rational_recipes.ingredient import Ingredient
 from rational_recipes.units import GRAM, Unit
 from rational_recipes.units import Factory as UnitFactory
+from rational_recipes.workers import process_pool
 
 
 def read_ingredients_from_header(header: str) -> tuple[Ingredient, ...]:
@@ -23,7 +30,7 @@ def read_ingredients_from_header(header: str) -> tuple[Ingredient, ...]:
     reader = csv.reader(io.StringIO(header))
     fields = next(reader)
     try:
-        return tuple(IngredientFactory.get_by_name(field.strip()) for field in fields)
+        return IngredientFactory.get_many([field.strip() for field in fields])
     except KeyError as error:
         msg = error.args[0]
         raise InvalidInputException(f"No such ingredient as {msg} (line 1)") from error
@@ -37,16 +44,30 @@ def split_header_and_rows(file_contents: str) -> tuple[str, list[str]]:
     return (lines[0], lines[1:])
 
 
-def ingredient_measures_from_row(
-    line_nr: int, row: str, nr_columns: int
-) -> Generator[tuple[int, str], None, None]:
-    """Parse measures from one row"""
+def stripped_lines(input_file: TextIO) -> Generator[str, None, None]:
+    """Read non-empty, stripped lines one at a time from a file handle"""
+    for line in input_file:
+        stripped = line.strip()
+        if len(stripped) > 0:
+            yield stripped
+
+
+def split_measures(line_nr: int, row: str, nr_columns: int) -> list[str]:
+    """Split one row into its (unstripped) measures"""
     measures = row.split(",")
     if len(measures) != nr_columns:
         raise InvalidInputException(
             f"The row on line {line_nr} has {len(measures)} columns"
             f" where {nr_columns} were expected"
         )
+    return measures
+
+
+def ingredient_measures_from_row(
+    line_nr: int, row: str, nr_columns: int
+) -> Generator[tuple[int, str], None, None]:
+    """Parse measures from one row"""
+    measures = split_measures(line_nr, row, nr_columns)
     for column_index in range(0, nr_columns):
         yield column_index, measures[column_index].strip()
 
@@ -57,6 +78,70 @@ MEASURE_PATTERN = re.compile(
 )
 
 
+# Value and unit of a measure, the non-zero branch of MEASURE_PATTERN
+UNIT_MATCHER = re.compile(r"([0-9]+|[0-9]*\.[0-9]+) *([a-zA-Z][a-zA-Z ]*)")
+
+
+def unit_spellings() -> dict[str, Unit]:
+    """Map the common spellings (as written, lower, upper and title case)
+    of every registered unit name to its unit, so that matched unit text is
+    looked up as is, without lowercasing or stripping it first."""
+    spellings: dict[str, Unit] = {}
+    for unit in UnitFactory.get_all():
+        for name in unit.synonyms():
+            for spelling in {name, name.lower(), name.upper(), name.title()}:
+                if UnitFactory.get_by_name(spelling) is unit:
+                    spellings[spelling] = unit
+    return spellings
+
+
+_UNIT_SPELLINGS = unit_spellings()
+
+MEASURE_CACHE_SIZE = 4096
+
+
+class _MeasureError(Exception):
+    """Parse failure for a measure token, raised without position details so
+    that value_and_unit can report the line and column."""
+
+    pass
+
+
+@functools.lru_cache(maxsize=MEASURE_CACHE_SIZE)
+def parse_measure(measure: str) -> tuple[float, Unit]:
+    """Parse one measure token into value and unit. Datasets repeat a small
+    set of measure strings, so results are memoised on the raw token text.
+    Measures with a commonly spelled unit are parsed by UNIT_MATCHER and a
+    single dict lookup, the rest (zeros, other spellings and errors) by
+    MEASURE_PATTERN."""
+    match = UNIT_MATCHER.match(measure)
+    if match is not None:
+        value, unit_text = match.groups()
+        unit = _UNIT_SPELLINGS.get(unit_text)
+        if unit is not None:
+            return float(value), unit
+    match = MEASURE_PATTERN.match(measure)
+    if match is None:
+        raise _MeasureError("Incorrect format of measurement")
+    if match.group("zero") == "0":
+        return 0, GRAM
+    value = float(match.group("value"))
+    unit = UnitFactory.get_by_name(match.group("unit").strip())
+    if unit is None:
+        raise _MeasureError(f"No unit named '{match.group('unit')}'")
+    return value, unit
+
+
+def measure_cache_info() -> "functools._CacheInfo":
+    """Return hit, miss and size counters for the measure token cache"""
+    return parse_measure.cache_info()
+
+
+def clear_measure_cache() -> None:
+    """Empty the measure token cache and reset its counters"""
+    parse_measure.cache_clear()
+
+
 def value_and_unit(line_nr: int, column_index: int, measure: str) -> tuple[float, Unit]:
     """Parse measure value and unit. The general form is a number followed by
     the unit, for example "1g" will be read as 1 gram. Any unit synonym
@@ -64,22 +149,12 @@ def value_and_unit(line_nr: int, column_index: int, measure: str) -> tuple[float
     A space may be used between value and unit, or not. A single zero, '0',
     without a unit specified will parse to zero grams.
     """
-    match = MEASURE_PATTERN.match(measure)
-    if match is not None:
-        if match.group("zero") == "0":
-            return 0, GRAM
-        value = float(match.group("value"))
-        unit = UnitFactory.get_by_name(match.group("unit").strip())
-        if unit is None:
-            raise InvalidInputException(
-                f"No unit named '{match.group('unit')}' at line"
-                f" {line_nr}, column {column_index}"
-            )
-        return value, unit
-    else:
+    try:
+        return parse_measure(measure)
+    except _MeasureError as error:
         raise InvalidInputException(
-            f"Incorrect format of measurement at line {line_nr}, column {column_index}"
-        )
+            f"{error.args[0]} at line {line_nr}, column {column_index}"
+        ) from None
 
 
 def read_files(
@@ -108,7 +183,7 @@ def read_files(
 
 
 def read_rows(
-    rows: list[str], nr_columns: int
+    rows: Iterable[str], nr_columns: int
 ) -> Generator[list[tuple[float, Unit]], None, None]:
     """Parse the rows of ingredient measurements from one file"""
     line_nr = 2
@@ -133,3 +208,180 @@ def parse_file_contents(
     ingredients = read_ingredients_from_header(header)
     new_rows = read_rows(rows, len(ingredients))
     return ingredients, new_rows
+
+
+def stream_file(
+    input_file: TextIO,
+) -> tuple[tuple[Ingredient, ...], Generator[list[tuple[float, Unit]], None, None]]:
+    """Read the header of one file and return the ingredients together with
+    a generator that parses the remaining rows line by line as they are
+    consumed. The file is closed once the rows are exhausted."""
+    lines = stripped_lines(input_file)
+    header = next(lines, None)
+    if header is None:
+        input_file.close()
+        raise InvalidInputException("Input file is empty")
+    ingredients = read_ingredients_from_header(header)
+
+    def rows() -> Generator[list[tuple[float, Unit]], None, None]:
+        with input_file:
+            yield from read_rows(lines, len(ingredients))
+
+    return ingredients, rows()
+
+
+def stream_files(
+    input_files: Sequence[TextIO],
+) -> tuple[tuple[Ingredient, ...], Generator[list[tuple[float, Unit]], None, None]]:
+    """Streaming counterpart of read_files. Only one row is held in memory at
+    a time. The header of each subsequent file is checked when the stream
+    reaches it."""
+    ingredients, first_rows = stream_file(input_files[0])
+
+    def rows() -> Generator[list[tuple[float, Unit]], None, None]:
+        yield from first_rows
+        for input_file in input_files[1:]:
+            tmp_ingredients, file_rows = stream_file(input_file)
+            if ingredients != tmp_ingredients:
+                input_file.close()
+                raise InvalidInputException(
+                    "All input files must have the same header."
+                )
+            yield from file_rows
+
+    return ingredients, rows()
+
+
+@dataclass
+class MeasureMatrix:
+    """Columnar ingredient measurements with one row per recipe and one
+    column per ingredient. Values are held in a float matrix and units in a
+    matching matrix of unit codes (see units.Factory.get_by_code)."""
+
+    values: npt.NDArray[numpy.float64]
+    units: npt.NDArray[numpy.int16]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def concatenate(cls, matrices: Sequence["MeasureMatrix"]) -> "MeasureMatrix":
+        """Concatenate the rows of several measure matrices"""
+        return cls(
+            numpy.concatenate([matrix.values for matrix in matrices]),
+            numpy.concatenate([matrix.units for matrix in matrices]),
+        )
+
+
+def read_measure_rows(
+    rows: Iterable[str], nr_columns: int, first_line_nr: int = 2
+) -> MeasureMatrix:
+    """Parse the rows of ingredient measurements from one file straight into
+    a measure matrix, without building intermediate per-cell tuples."""
+    values = array("d")
+    units = array("h")
+    line_nr = first_line_nr
+    for row in rows:
+        measures = split_measures(line_nr, row, nr_columns)
+        for column_index in range(nr_columns):
+            value, unit = value_and_unit(
+                line_nr, column_index, measures[column_index].strip()
+            )
+            values.append(value)
+            units.append(unit.code)
+        line_nr += 1
+    return MeasureMatrix(
+        numpy.frombuffer(values, dtype=numpy.float64).reshape(-1, nr_columns),
+        numpy.frombuffer(units, dtype=numpy.int16).reshape(-1, nr_columns),
+    )
+
+
+def parse_file_measures(
+    file_contents: str,
+) -> tuple[tuple[Ingredient, ...], MeasureMatrix]:
+    """Parse the contents of one file returning the ingredients and a
+    measure matrix.
+    """
+    header, rows = split_header_and_rows(file_contents)
+    ingredients = read_ingredients_from_header(header)
+    return ingredients, read_measure_rows(rows, len(ingredients))
+
+
+def combine_files[T](
+    parsed_files: Iterable[tuple[tuple[Ingredient, ...], T]],
+) -> tuple[tuple[Ingredient, ...], list[T]]:
+    """Collect the parsed data of several files, in order. Columns
+    (i.e. ingredients) must be identical between files."""
+    data: list[T] = []
+    ingredients: tuple[Ingredient, ...] | None = None
+    for tmp_ingredients, file_data in parsed_files:
+        if ingredients is None:
+            ingredients = tmp_ingredients
+        elif ingredients != tmp_ingredients:
+            raise InvalidInputException("All input files must have the same header.")
+        data.append(file_data)
+    assert ingredients is not None
+    return ingredients, data
+
+
+def read_measures(
+    input_files: Sequence[TextIO],
+) -> tuple[tuple[Ingredient, ...], MeasureMatrix]:
+    """Columnar counterpart of read_files. Rows from multiple files are
+    concatenated into a single measure matrix.
+    """
+
+    def parse(input_file: TextIO) -> tuple[tuple[Ingredient, ...], MeasureMatrix]:
+        with input_file:
+            return parse_file_measures(input_file.read())
+
+    ingredients, matrices = combine_files(
+        parse(input_file) for input_file in input_files
+    )
+    return ingredients, MeasureMatrix.concatenate(matrices)
+
+
+def map_files[T](
+    function: Callable[[str], tuple[str, T]], filenames: Sequence[str], jobs: int = 1
+) -> Generator[tuple[tuple[Ingredient, ...], T], None, None]:
+    """Apply a parse function to each file name, in order, running up to
+    `jobs` calls concurrently in worker processes (all cores if jobs is zero
+    or less). The function returns the header line of the file with its
+    parsed data. Ingredients do not survive the trip between processes with
+    their identity intact, so headers are resolved here instead. Registered
+    ingredients are registered again in each worker process."""
+    if jobs == 1 or len(filenames) < 2:
+        for header, file_data in map(function, filenames):
+            yield read_ingredients_from_header(header), file_data
+        return
+    workers = min(jobs, len(filenames)) if jobs > 0 else None
+    registered = IngredientFactory.registered()
+    with process_pool(workers, _register_ingredients, (registered,)) as executor:
+        for header, file_data in executor.map(function, filenames):
+            yield read_ingredients_from_header(header), file_data
+
+
+def _register_ingredients(ingredients: list[Ingredient]) -> None:
+    """Register ingredients in a worker process as in its parent"""
+    for ingredient in ingredients:
+        IngredientFactory.register(ingredient)
+
+
+def parse_measure_file(filename: str) -> tuple[str, MeasureMatrix]:
+    """Parse one input file by name returning its header line and measure
+    matrix."""
+    with open(filename) as input_file:
+        header, rows = split_header_and_rows(input_file.read())
+    ingredients = read_ingredients_from_header(header)
+    return header, read_measure_rows(rows, len(ingredients))
+
+
+def read_measure_files(
+    filenames: Sequence[str], jobs: int = 1
+) -> tuple[tuple[Ingredient, ...], MeasureMatrix]:
+    """Read input files by name, optionally parsing them in parallel (see
+    map_files). Header checks and row order are the same as when the files
+    are read one after another."""
+    parsed_files = map_files(parse_measure_file, filenames, jobs)
+    ingredients, matrices = combine_files(parsed_files)
+    return ingredients, MeasureMatrix.concatenate(matrices)
@@ -0,0 +1,117 @@
+"""Ingredient lookups for asyncio programs.
+
+Ingredients are looked up in the SQLite database on a dedicated thread
+pool, so lookups never block the event loop. Concurrent lookups of the
+same name share a single database load. Units need no such wrapper, they
+are looked up in memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import weakref
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from rational_recipes.ingredient import Factory, Ingredient
+
+# Threads querying the ingredient database
+WORKERS = 4
+
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=WORKERS, thread_name_prefix="rational-recipes-db"
+)
+
+# Loads in progress on each event loop, keyed by lowercase name
+_PENDING: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, asyncio.Future[Ingredient]]
+] = weakref.WeakKeyDictionary()
+
+
+async def resolve_ingredient(name: str) -> Ingredient:
+    """Lookup an Ingredient instance by name without blocking the event loop.
+    Raises KeyError if the ingredient is not found, as get_by_name does."""
+    (ingredient,) = await resolve_many([name])
+    return ingredient
+
+
+async def resolve_many(names: Sequence[str]) -> tuple[Ingredient, ...]:
+    """Lookup several Ingredient instances by name, e.g. all ingredients of
+    a scraped recipe, without blocking the event loop.
+
+    Names that are not cached, or already being loaded for another caller,
+    are loaded together in one job on the database threads. Raises KeyError
+    for the first name that is not found, as get_many does.
+    """
+    loop = asyncio.get_running_loop()
+    pending = _PENDING.setdefault(loop, {})
+    keys = [name.lower().strip() for name in names]
+    futures: dict[str, asyncio.Future[Ingredient]] = {}
+    batch: dict[str, str] = {}
+    for name, key in zip(names, keys, strict=True):
+        if key in futures:
+            continue
+        if key in pending:
+            futures[key] = pending[key]
+            continue
+        future = futures[key] = loop.create_future()
+        ingredient = Factory.get_cached(key)
+        if ingredient is not None:
+            future.set_result(ingredient)
+            continue
+        pending[key] = future
+        batch[key] = name
+
+    if batch:
+        load = loop.run_in_executor(_EXECUTOR, _load, list(batch.values()))
+        load.add_done_callback(functools.partial(_settle, pending, list(batch)))
+
+    results = await asyncio.gather(
+        *(asyncio.shield(futures[key]) for key in keys), return_exceptions=True
+    )
+    ingredients: list[Ingredient] = []
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+        ingredients.append(result)
+    return tuple(ingredients)
+
+
+def _load(names: list[str]) -> list[Ingredient | KeyError]:
+    """Lookup names in one batch, returning the KeyError of unknown names in
+    their place. Runs on the database threads."""
+    try:
+        return list(Factory.get_many(names))
+    except KeyError:
+        # The names that were found are cached now
+        pass
+    results: list[Ingredient | KeyError] = []
+    for name in names:
+        try:
+            results.append(Factory.get_by_name(name))
+        except KeyError as error:
+            results.append(error)
+    return results
+
+
+def _settle(
+    pending: dict[str, asyncio.Future[Ingredient]],
+    keys: list[str],
+    load: asyncio.Future[list[Ingredient | KeyError]],
+) -> None:
+    """Pass the results of a batch load on to the waiting callers"""
+    for index, key in enumerate(keys):
+        future = pending.pop(key)
+        if load.cancelled():
+            future.cancel()
+            continue
+        error = load.exception()
+        if error is not None:
+            future.set_exception(error)
+            continue
+        result = load.result()[index]
+        if isinstance(result, KeyError):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
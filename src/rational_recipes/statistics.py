@@ -1,19 +1,260 @@
 """Calculation and formatting of statistics"""
 
-import math
+import os
 from collections.abc import Generator, Sequence
-from typing import Any
+from typing import Any, NamedTuple
 
 import numpy
 import numpy.typing as npt
 
 from rational_recipes.columns import ColumnTranslator
 from rational_recipes.difference import percentage_difference_from_mean
+from rational_recipes.errors import InvalidArgumentException, InvalidInputException
 from rational_recipes.ingredient import Ingredient
-from rational_recipes.normalize import normalize_to_100g
+from rational_recipes.normalize import normalize_matrix_to_100g
 from rational_recipes.output import Output
+from rational_recipes.quantiles import (
+    QUARTILES,
+    SKETCH_SEED,
+    QuantileSketch,
+    exact_quantiles,
+    exact_trimmed_means,
+    weighted_quantiles,
+    weighted_trimmed_means,
+)
+from rational_recipes.workers import process_pool
 
 Z_VALUE = 1.96  # represents a confidence level of 95%
+CONFIDENCE_LEVEL = 0.95
+
+# Bootstrap resamples times rows drawn at a time, by one process. A block
+# takes about 24 bytes per cell.
+BOOTSTRAP_BLOCK_CELLS = 2**20
+
+
+class RobustStatistics(NamedTuple):
+    """Per ingredient statistics that are not thrown off by skew and
+    outliers"""
+
+    medians: list[float]
+    lower_quartiles: list[float]
+    upper_quartiles: list[float]
+    trimmed_means: list[float]
+
+
+def statistics_buffer(
+    rows: Any, dtype: npt.DTypeLike = numpy.float64
+) -> npt.NDArray[numpy.floating[Any]]:
+    """Copy rows into a new column-major matrix of dtype, for statistics to
+    normalize in place"""
+    if not isinstance(rows, numpy.ndarray):
+        # Rows may be any iterable, such as tuples from zip
+        rows = list(rows)
+    buffer: npt.NDArray[numpy.floating[Any]] = numpy.array(
+        rows, dtype=dtype, order="F", ndmin=2
+    )
+    return buffer
+
+
+def column_moments(
+    data: npt.NDArray[numpy.floating[Any]],
+) -> tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.float64]]:
+    """Mean and (population) standard deviation of each column of a matrix.
+
+    Columns are reduced one at a time, so temporary arrays are the size of
+    a column rather than the matrix. Each column is summed pairwise and in
+    float64, so float32 data loses no accuracy beyond its own rounding.
+    """
+    means = numpy.empty(data.shape[1])
+    std_deviations = numpy.empty(data.shape[1])
+    for i in range(data.shape[1]):
+        column = data[:, i]
+        means[i] = column.mean(dtype=numpy.float64)
+        std_deviations[i] = column.std(dtype=numpy.float64)
+    return means, std_deviations
+
+
+def weighted_column_moments(
+    data: npt.NDArray[numpy.floating[Any]], weights: npt.NDArray[numpy.float64]
+) -> tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.float64]]:
+    """Weighted mean and (population) standard deviation of each column of a
+    matrix with one weight per row, reduced column by column as in
+    column_moments"""
+    total = weights.sum()
+    means = numpy.empty(data.shape[1])
+    variances = numpy.empty(data.shape[1])
+    for i in range(data.shape[1]):
+        column = data[:, i].astype(numpy.float64)
+        means[i] = weights @ column / total
+        column -= means[i]
+        variances[i] = weights @ (column * column) / total
+    return means, numpy.sqrt(variances)
+
+
+def effective_sample_size(weights: npt.NDArray[numpy.float64]) -> float:
+    """Number of equally weighted rows that would give a mean as precise as
+    rows with these weights (Kish's effective sample size)"""
+    return float(weights.sum() ** 2 / (weights**2).sum())
+
+
+def check_weights(weights: npt.NDArray[numpy.float64], nr_rows: int) -> None:
+    """Raise InvalidArgumentException unless there is a non-negative weight
+    for every row, and not all weights are zero"""
+    if weights.shape != (nr_rows,):
+        raise InvalidArgumentException(
+            f"Expected {nr_rows} row weights, got {len(weights)}"
+        )
+    if (weights < 0).any() or not weights.any():
+        raise InvalidArgumentException(
+            "Row weights must not be negative and not all be zero"
+        )
+
+
+def confidence_intervals(
+    std_deviations: npt.NDArray[numpy.float64],
+    sample_sizes: npt.NDArray[numpy.int64] | float,
+) -> npt.NDArray[numpy.float64]:
+    """Half widths of the 95% confidence intervals of column means"""
+    intervals: npt.NDArray[numpy.float64] = (
+        std_deviations / numpy.sqrt(sample_sizes) * Z_VALUE
+    )
+    return intervals
+
+
+def minimum_sample_sizes(
+    std_deviations: npt.NDArray[numpy.float64],
+    means: npt.NDArray[numpy.float64],
+    desired_interval: float,
+) -> npt.NDArray[numpy.int64]:
+    """Minimum sample size of each column for a confidence interval of
+    desired_interval difference from the mean, or 0 for zero means"""
+    sizes = numpy.zeros(len(means), dtype=numpy.int64)
+    nonzero = means != 0
+    sizes[nonzero] = numpy.ceil(
+        ((Z_VALUE * std_deviations[nonzero]) / (means[nonzero] * desired_interval)) ** 2
+    )
+    return sizes
+
+
+def bootstrap_bounds(
+    data: npt.NDArray[numpy.floating[Any]],
+    resamples: int,
+    seed: int | None = None,
+    jobs: int = 1,
+    weights: npt.NDArray[numpy.float64] | None = None,
+) -> tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.float64]]:
+    """Percentile bootstrap confidence bounds of the column means of a
+    matrix, at CONFIDENCE_LEVEL. With row weights, the bounds are those of
+    the weighted means of the resamples.
+
+    Resamples are drawn in blocks of about BOOTSTRAP_BLOCK_CELLS resamples
+    times rows, so memory use does not grow with the number of resamples.
+    Blocks are split into one run of consecutive blocks per process, over
+    jobs processes (all cores if jobs <= 0), and each process is sent the
+    data only once. Each block has its own seed spawned from seed, so the
+    bounds only depend on the seed and not on jobs.
+    """
+    block_size = max(1, BOOTSTRAP_BLOCK_CELLS // len(data))
+    sizes = [
+        min(block_size, resamples - start) for start in range(0, resamples, block_size)
+    ]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(sizes))
+    workers = min(jobs if jobs > 0 else os.cpu_count() or 1, len(sizes))
+    if workers == 1:
+        means = _bootstrap_blocks(sizes, seeds, data, weights)
+    else:
+        runs = numpy.array_split(numpy.arange(len(sizes)), workers)
+        with process_pool(workers, _set_bootstrap_data, (data, weights)) as executor:
+            futures = [
+                executor.submit(
+                    _bootstrap_blocks,
+                    [sizes[block] for block in run],
+                    [seeds[block] for block in run],
+                )
+                for run in runs
+            ]
+            means = numpy.concatenate([future.result() for future in futures])
+    tail = (1 - CONFIDENCE_LEVEL) / 2
+    lower, upper = numpy.quantile(means, [tail, 1 - tail], axis=0)
+    return lower, upper
+
+
+# Data and row weights resampled by a bootstrap worker process, set once
+# when the process starts
+_worker_data: (
+    tuple[npt.NDArray[numpy.floating[Any]], npt.NDArray[numpy.float64] | None] | None
+) = None
+
+
+def _set_bootstrap_data(
+    data: npt.NDArray[numpy.floating[Any]],
+    weights: npt.NDArray[numpy.float64] | None,
+) -> None:
+    """Keep the data to resample in a worker process"""
+    global _worker_data
+    _worker_data = data, weights
+
+
+def _bootstrap_blocks(
+    sizes: Sequence[int],
+    seeds: Sequence[numpy.random.SeedSequence],
+    data: npt.NDArray[numpy.floating[Any]] | None = None,
+    weights: npt.NDArray[numpy.float64] | None = None,
+) -> npt.NDArray[numpy.float64]:
+    """Column means of the resamples of consecutive blocks, of the given
+    data or else of the data kept by the worker process"""
+    if data is None:
+        assert _worker_data is not None
+        data, weights = _worker_data
+    return numpy.concatenate(
+        [
+            _bootstrap_block(data, weights, size, seed)
+            for size, seed in zip(sizes, seeds, strict=True)
+        ]
+    )
+
+
+def _bootstrap_block(
+    data: npt.NDArray[numpy.floating[Any]],
+    weights: npt.NDArray[numpy.float64] | None,
+    size: int,
+    seed: numpy.random.SeedSequence,
+) -> npt.NDArray[numpy.float64]:
+    """Column means of size resamples of the rows of a matrix. Each resample
+    is drawn as counts of how often every row is picked, so the means of the
+    whole block are a single matrix product."""
+    rng = numpy.random.default_rng(seed)
+    nr_rows = len(data)
+    picks = rng.integers(0, nr_rows, (size, nr_rows))
+    # Offset each resample's picks so one bincount counts them all
+    picks += numpy.arange(size)[:, numpy.newaxis] * nr_rows
+    counts = numpy.bincount(picks.ravel(), minlength=size * nr_rows)
+    picked = counts.reshape(size, nr_rows).astype(numpy.float64)
+    if weights is None:
+        means: npt.NDArray[numpy.float64] = picked @ data / nr_rows
+        return means
+    picked *= weights
+    weighted_means: npt.NDArray[numpy.float64] = (
+        picked @ data / picked.sum(axis=1, keepdims=True)
+    )
+    return weighted_means
+
+
+def robust_statistics(
+    data: npt.NDArray[numpy.floating[Any]],
+    weights: npt.NDArray[numpy.float64] | None = None,
+) -> RobustStatistics:
+    """Exact median, quartiles and trimmed mean of each column of a matrix,
+    optionally with weighted rows"""
+    if weights is None:
+        lower, median, upper = exact_quantiles(data, QUARTILES)
+        trimmed_means = exact_trimmed_means(data)
+    else:
+        lower, median, upper = weighted_quantiles(data, weights, QUARTILES)
+        trimmed_means = weighted_trimmed_means(data, weights)
+    return RobustStatistics(
+        median.tolist(), lower.tolist(), upper.tolist(), trimmed_means.tolist()
+    )
 
 
 def calculate_minimum_sample_sizes(
@@ -21,23 +262,24 @@ def calculate_minimum_sample_sizes(
 ) -> Generator[int, None, None]:
     """Calculate minimum sample size needed for a confidence interval
     of 5% difference from the mean with 95% confidence level"""
-    for std, mean in zip(std_deviations, means, strict=False):
-        if mean == 0:
-            yield 0
-        else:
-            yield math.ceil(((Z_VALUE * std) / (mean * desired_interval)) ** 2)
+    sizes = minimum_sample_sizes(
+        numpy.asarray(std_deviations, dtype=numpy.float64),
+        numpy.asarray(means, dtype=numpy.float64),
+        desired_interval,
+    )
+    for size in sizes:
+        yield int(size)
 
 
 def calculate_confidence_intervals(
     data: Any, std_deviations: list[float]
 ) -> list[float]:
     """Calculate confidence intervals for each ingredient"""
-    intervals: list[float] = []
-    for column, std in zip(data, std_deviations, strict=False):
-        sample_size = len(column)
-        std_error = std / math.sqrt(sample_size)
-        intervals.append(std_error * Z_VALUE)
-    return intervals
+    sample_sizes = numpy.array([len(column) for column in data], dtype=numpy.int64)
+    intervals = confidence_intervals(
+        numpy.asarray(std_deviations, dtype=numpy.float64), sample_sizes
+    )
+    return [float(interval) for interval in intervals]
 
 
 def create_zero_filter(
@@ -60,14 +302,12 @@ def filter_zeros(
 ) -> list[Any]:
     """Filter zero values according to specification"""
     new_data: list[Any] = []
-    for i in range(len(data)):
-        column = data[i]
+    for i, column in enumerate(data):
         if filter_map[i]:
-            column = list(value for value in column if float(value) != 0.0)
-            new_data.append(numpy.array(column))
+            column = numpy.asarray(column)
+            new_data.append(column[column != 0.0])
         else:
             new_data.append(column)
-
     return new_data
 
 
@@ -77,26 +317,58 @@ def apply_defaults(
     filter_map: dict[int, bool],
 ) -> list[list[float]]:
     """Apply default values to zero columns according to settings"""
-    new_data: list[list[float]] = []
+    matrix = numpy.array(data, dtype=numpy.float64, ndmin=2)
+    impute_zeros(matrix, defaults, filter_map)
+    rows: list[list[float]] = matrix.tolist()
+    return rows
+
+
+def impute_zeros(
+    data: npt.NDArray[numpy.floating[Any]],
+    defaults: Sequence[float],
+    filter_map: dict[int, bool],
+) -> None:
+    """Replace zeros in the filtered columns of a normalized matrix, in place,
+    by each column's share of the defaults. The rest of such a row is scaled
+    down by the same share first, once for each zero."""
     total = sum(defaults)
     percentages = [default / total for default in defaults]
-    col_range = range(len(data[0]))
-    for original_row in data:
-        row = list(original_row)
-        for i in col_range:
-            if filter_map[i] and row[i] == 0:
-                row = [column - (column * percentages[i]) for column in row]
-        for i in col_range:
-            if filter_map[i] and row[i] == 0:
-                row[i] = percentages[i] * 100
-        new_data.append(row)
-    return new_data
+    columns = [i for i in range(data.shape[1]) if filter_map[i]]
+    # Which rows have a zero in each filtered column, before any scaling
+    zeros = data[:, columns] == 0
+    for zero_rows, i in zip(zeros.T, columns, strict=True):
+        data[zero_rows] -= data[zero_rows] * percentages[i]
+    for zero_rows, i in zip(zeros.T, columns, strict=True):
+        data[zero_rows, i] = percentages[i] * 100
+
+
+def zero_filtered_means(
+    data: npt.NDArray[numpy.floating[Any]],
+    filter_map: dict[int, bool],
+    weights: npt.NDArray[numpy.float64] | None = None,
+) -> list[float]:
+    """Column means of a matrix, optionally weighted by row, leaving zeros
+    out of the filtered columns"""
+    if weights is None:
+        weights = numpy.ones(len(data))
+    columns = [i for i in range(data.shape[1]) if filter_map[i]]
+    kept = numpy.ones(data.shape, dtype=bool)
+    kept[:, columns] = data[:, columns] != 0.0
+    row_weights = kept * weights[:, numpy.newaxis]
+    means = (row_weights * data).sum(axis=0) / row_weights.sum(axis=0)
+    result: list[float] = means.tolist()
+    return result
 
 
 def calculate_variables(
     data: Any,
 ) -> tuple[list[float], list[float], list[float]]:
     """Calculate standard deviation, mean and confidence interval vectors"""
+    if isinstance(data, numpy.ndarray) and data.ndim == 2:
+        # Ingredients as rows, as from calculate_statistics
+        means_array, std_array = column_moments(data.T)
+        intervals_array = confidence_intervals(std_array, data.shape[1])
+        return intervals_array.tolist(), std_array.tolist(), means_array.tolist()
     std_deviations: list[float] = []
     means: list[float] = []
     for column in data:
@@ -106,46 +378,282 @@ def calculate_variables(
     return intervals, std_deviations, means
 
 
+def impute_zero_columns(
+    data: npt.NDArray[numpy.floating[Any]],
+    ingredients: tuple[Ingredient, ...],
+    zero_columns: list[str],
+    weights: npt.NDArray[numpy.float64] | None = None,
+) -> None:
+    """Replace zeros in the specified columns of a normalized matrix, in
+    place, by default values: the column means computed without the zeros,
+    weighted by row if weights are given.
+    """
+    filter_map = create_zero_filter(ingredients, zero_columns)
+    for i, ingredient in enumerate(ingredients):
+        if filter_map[i] and not data[:, i].any():
+            raise InvalidInputException(
+                f"Zeros cannot be ignored for {ingredient}, it has no other values"
+            )
+    defaults = zero_filtered_means(data, filter_map, weights)
+    impute_zeros(data, defaults, filter_map)
+
+
 def filter_zero_columns(
-    raw_data: list[tuple[float, ...]],
+    raw_data: Sequence[Sequence[float]] | npt.NDArray[numpy.float64],
     ingredients: tuple[Ingredient, ...],
     zero_columns: list[str],
-) -> list[list[float]]:
+) -> npt.NDArray[numpy.float64]:
     """Filter zero values from specified columns and apply defaults.
 
     Normalizes data to 100g proportions, filters zeros from the specified
     columns, computes default values from the filtered data, and applies
-    them back. Returns row-major data ready for further processing.
+    them back. Returns a new row-major matrix ready for further processing.
     """
-    normalized = list(normalize_to_100g(raw_data))
-    data = numpy.array(normalized).transpose()
-    filter_map = create_zero_filter(ingredients, zero_columns)
-    data_filtered = filter_zeros(data, filter_map)
-    _, _, defaults = calculate_variables(data_filtered)
-    return apply_defaults(normalized, defaults, filter_map)
+    data = numpy.array(raw_data, dtype=numpy.float64, ndmin=2)
+    normalize_matrix_to_100g(data, out=data)
+    impute_zero_columns(data, ingredients, zero_columns)
+    return data
 
 
 def calculate_statistics(
-    raw_data: Sequence[Sequence[float]],
+    raw_data: Sequence[Sequence[float]] | npt.NDArray[numpy.floating[Any]],
     ingredients: tuple[Ingredient, ...],
     zero_columns: list[str] | None,
+    bootstrap: int = 0,
+    seed: int | None = None,
+    jobs: int = 1,
+    robust: bool = False,
+    weights: Sequence[float] | npt.NDArray[numpy.float64] | None = None,
+    dtype: npt.DTypeLike = numpy.float64,
+    copy: bool = True,
 ) -> "Statistics":
     """Calculate mean, confidence interval and minimum sample size for each
-    ingredient.
+    ingredient. With bootstrap resamples the confidence intervals are
+    bootstrap percentile intervals instead of normal approximations. With
+    robust, medians, quartiles and trimmed means are calculated as well.
+
+    With a weight per row, e.g. to count near duplicates or less reliable
+    sources for less, all statistics are weighted and intervals are based
+    on the effective sample size of the weights.
+
+    The data is held in one column-major buffer of dtype, normalized in
+    place. float32 halves its memory. Without copy, a matrix of raw_data
+    that already is such a buffer is used, and overwritten, as it is.
     """
-    processed: Sequence[Sequence[float]]
+    if copy or not isinstance(raw_data, numpy.ndarray):
+        data = statistics_buffer(raw_data, dtype)
+    else:
+        data = numpy.asarray(raw_data, dtype=dtype, order="F")
+    row_weights = None
+    if weights is not None:
+        row_weights = numpy.asarray(weights, dtype=numpy.float64)
+        check_weights(row_weights, len(data))
+    normalize_matrix_to_100g(data, out=data)
     if zero_columns is not None and len(zero_columns) > 0:
-        processed = filter_zero_columns(
-            [tuple(row) for row in raw_data],
+        impute_zero_columns(data, ingredients, zero_columns, row_weights)
+        normalize_matrix_to_100g(data, out=data)
+    if row_weights is None:
+        means, std_deviations = column_moments(data)
+        intervals = confidence_intervals(std_deviations, len(data))
+    else:
+        means, std_deviations = weighted_column_moments(data, row_weights)
+        sample_size = effective_sample_size(row_weights)
+        intervals = confidence_intervals(std_deviations, sample_size)
+    statistics = Statistics(
+        ingredients, intervals.tolist(), std_deviations.tolist(), means.tolist()
+    )
+    if row_weights is not None:
+        statistics.effective_sample_size = sample_size
+    if bootstrap > 0:
+        lower, upper = bootstrap_bounds(data, bootstrap, seed, jobs, row_weights)
+        statistics.set_bounds(lower.tolist(), upper.tolist())
+    if robust:
+        statistics.robust = robust_statistics(data, row_weights)
+    return statistics
+
+
+def pack_datasets(
+    datasets: Sequence[npt.NDArray[numpy.float64]],
+) -> tuple[
+    npt.NDArray[numpy.float64], npt.NDArray[numpy.int64], npt.NDArray[numpy.int64]
+]:
+    """Pack matrices of recipes, which may differ in both numbers of rows
+    and columns, into one ragged array for batch_statistics: the values of
+    all matrices one row after another, the offset of each matrix in them
+    (and the end of the last) and the number of columns of each matrix."""
+    values = numpy.concatenate(
+        [numpy.ravel(dataset) for dataset in datasets] or [numpy.empty(0)]
+    ).astype(numpy.float64)
+    offsets = numpy.zeros(len(datasets) + 1, dtype=numpy.int64)
+    numpy.cumsum([numpy.size(dataset) for dataset in datasets], out=offsets[1:])
+    widths = numpy.array(
+        [numpy.shape(dataset)[1] for dataset in datasets], dtype=numpy.int64
+    )
+    return values, offsets, widths
+
+
+def batch_statistics(
+    values: npt.NDArray[numpy.float64],
+    offsets: npt.NDArray[numpy.int64],
+    widths: npt.NDArray[numpy.int64],
+    desired_interval: float = 0.05,
+) -> "BatchStatistics":
+    """Calculate the statistics of calculate_statistics, and minimum sample
+    sizes, for many data sets packed by pack_datasets at once.
+
+    Every value is labelled with its row and column over all data sets, so
+    normalizing rows and reducing columns are single bincount calls instead
+    of a Python loop over the data sets.
+    """
+    sample_sizes = numpy.diff(offsets) // widths
+    column_offsets = numpy.zeros(len(widths) + 1, dtype=numpy.int64)
+    numpy.cumsum(widths, out=column_offsets[1:])
+
+    # Labels are built by repeating per row numbers, which is much faster
+    # than dividing every value's position by its row width
+    row_widths = numpy.repeat(widths, sample_sizes)
+    row_starts = numpy.cumsum(row_widths) - row_widths
+    first_columns = numpy.repeat(column_offsets[:-1], sample_sizes)
+    row_ids = numpy.repeat(numpy.arange(len(row_widths)), row_widths)
+    column_ids = numpy.arange(len(values)) + numpy.repeat(
+        first_columns - row_starts, row_widths
+    )
+
+    totals = numpy.bincount(row_ids, values, minlength=len(row_widths))
+    if not totals.all():
+        raise ZeroDivisionError("float division by zero")
+    normalized = values * (100 / totals)[row_ids]
+
+    nr_columns = int(column_offsets[-1])
+    counts = numpy.repeat(sample_sizes, widths)
+    means = numpy.bincount(column_ids, normalized, minlength=nr_columns) / counts
+    deviations = (normalized - means[column_ids]) ** 2
+    std_deviations = numpy.sqrt(
+        numpy.bincount(column_ids, deviations, minlength=nr_columns) / counts
+    )
+    return BatchStatistics(
+        column_offsets,
+        sample_sizes,
+        means,
+        std_deviations,
+        confidence_intervals(std_deviations, counts),
+        minimum_sample_sizes(std_deviations, means, desired_interval),
+    )
+
+
+class BatchStatistics(NamedTuple):
+    """Statistics of many data sets. The per column arrays hold the columns
+    of all data sets one after another, those of data set i starting at
+    column_offsets[i]."""
+
+    column_offsets: npt.NDArray[numpy.int64]
+    sample_sizes: npt.NDArray[numpy.int64]
+    means: npt.NDArray[numpy.float64]
+    std_deviations: npt.NDArray[numpy.float64]
+    intervals: npt.NDArray[numpy.float64]
+    min_sample_sizes: npt.NDArray[numpy.int64]
+
+    def columns(self, index: int) -> slice:
+        """The columns of one data set"""
+        return slice(self.column_offsets[index], self.column_offsets[index + 1])
+
+    def statistics(
+        self, index: int, ingredients: tuple[Ingredient, ...]
+    ) -> "Statistics":
+        """Statistics of one data set"""
+        columns = self.columns(index)
+        return Statistics(
             ingredients,
-            zero_columns,
+            self.intervals[columns].tolist(),
+            self.std_deviations[columns].tolist(),
+            self.means[columns].tolist(),
         )
-    else:
-        processed = raw_data
-    normalized = list(normalize_to_100g(processed))
-    data = numpy.array(normalized).transpose()
-    intervals, std_deviations, means = calculate_variables(data)
-    return Statistics(ingredients, intervals, std_deviations, means)
+
+
+class StatsAccumulator:
+    """Running per-column count, mean and sum of squared deviations from the
+    mean (Welford's algorithm). Rows normalized to 100g are added one at a
+    time or in batches, so statistics can be calculated without holding the
+    data set in memory. Accumulators of separate shards of the data can be
+    merged (Chan's parallel algorithm). With robust, a quantile sketch of
+    the rows is kept as well, for approximate robust statistics. The sketch
+    is seeded with seed, or SKETCH_SEED if none is given, so the same rows
+    give the same statistics on every run."""
+
+    def __init__(
+        self, nr_columns: int, robust: bool = False, seed: int | None = None
+    ) -> None:
+        self.count = 0
+        self.means: npt.NDArray[numpy.float64] = numpy.zeros(nr_columns)
+        self.squares: npt.NDArray[numpy.float64] = numpy.zeros(nr_columns)
+        self.sketch: QuantileSketch | None = None
+        if robust:
+            self.sketch = QuantileSketch(
+                nr_columns, seed=SKETCH_SEED if seed is None else seed
+            )
+
+    def add(self, row: Sequence[float]) -> None:
+        """Add one normalized row"""
+        values = numpy.asarray(row, dtype=numpy.float64)
+        self.count += 1
+        delta = values - self.means
+        self.means += delta / self.count
+        self.squares += delta * (values - self.means)
+        if self.sketch is not None:
+            self.sketch.add_batch(values[numpy.newaxis])
+
+    def add_batch(self, rows: npt.NDArray[numpy.float64]) -> None:
+        """Add a matrix of normalized rows"""
+        if len(rows) == 0:
+            return
+        means, std_deviations = column_moments(rows)
+        self._combine(len(rows), means, std_deviations**2 * len(rows))
+        if self.sketch is not None:
+            self.sketch.add_batch(rows)
+
+    def merge(self, other: "StatsAccumulator") -> None:
+        """Add the rows of another accumulator, e.g. of another shard"""
+        if other.count == 0:
+            return
+        self._combine(other.count, other.means, other.squares)
+        if self.sketch is not None:
+            if other.sketch is None:
+                raise ValueError("Cannot merge an accumulator without a sketch")
+            self.sketch.merge(other.sketch)
+
+    def _combine(
+        self,
+        count: int,
+        means: npt.NDArray[numpy.float64],
+        squares: npt.NDArray[numpy.float64],
+    ) -> None:
+        """Combine the moments of another set of rows with these"""
+        total = self.count + count
+        delta = means - self.means
+        self.means = self.means + delta * (count / total)
+        self.squares = self.squares + squares + delta**2 * (self.count * count / total)
+        self.count = total
+
+    def statistics(self, ingredients: tuple[Ingredient, ...]) -> "Statistics":
+        """Calculate the same statistics as calculate_statistics for the rows
+        added so far"""
+        std_deviations = numpy.sqrt(self.squares / self.count)
+        intervals = confidence_intervals(std_deviations, self.count)
+        statistics = Statistics(
+            ingredients,
+            intervals.tolist(),
+            std_deviations.tolist(),
+            self.means.tolist(),
+        )
+        if self.sketch is not None:
+            lower, median, upper = self.sketch.quantiles(QUARTILES)
+            statistics.robust = RobustStatistics(
+                median.tolist(),
+                lower.tolist(),
+                upper.tolist(),
+                self.sketch.trimmed_means().tolist(),
+            )
+        return statistics
 
 
 class Statistics:
@@ -163,6 +671,11 @@ class Statistics:
         self.std_deviations = std_deviations
         self.desired_interval: float = 0.05
         self.means = means
+        # Bootstrap confidence bounds, which need not be symmetric
+        self.bounds: list[tuple[float, float]] | None = None
+        self.robust: RobustStatistics | None = None
+        # Set when rows are weighted
+        self.effective_sample_size: float | None = None
         self._precision: int = 2
 
     def _float_format(self) -> str:
@@ -174,6 +687,21 @@ class Statistics:
         for floating point as_percentages."""
         self._precision = precision
 
+    def set_bounds(self, lower: list[float], upper: list[float]) -> None:
+        """Use (bootstrap) confidence bounds instead of the intervals"""
+        self.bounds = list(zip(lower, upper, strict=True))
+        self.intervals = [(high - low) / 2 for low, high in self.bounds]
+
+    def interval_widths(self) -> list[tuple[float, float]]:
+        """Distances from each mean down to the lower and up to the upper end
+        of its confidence interval"""
+        if self.bounds is None:
+            return [(interval, interval) for interval in self.intervals]
+        return [
+            (mean - low, high - mean)
+            for mean, (low, high) in zip(self.means, self.bounds, strict=True)
+        ]
+
     def set_desired_interval(self, desired_interval: float) -> None:
         """Set desired confidence interval"""
         self.desired_interval = desired_interval
@@ -201,17 +729,18 @@ class Statistics:
         self,
         output: Output,
         percentage: float,
-        interval: float,
+        widths: tuple[float, float],
         ingredient: Ingredient,
     ) -> None:
         """Output confidence interval for one ingredient"""
-        upper_value = percentage + interval
+        below, above = widths
+        upper_value = percentage + above
         upper = self._float_format() % upper_value
-        lower_value = percentage - interval
+        lower_value = percentage - below
         lower = self._float_format() % lower_value
         mean = self._float_format() % percentage
         text = "The " + str(ingredient) + " proportion "
-        if interval == 0.0:
+        if below == above == 0.0:
             difference = 0.0
         else:
             difference = percentage_difference_from_mean(lower_value, upper_value) * 100
@@ -228,7 +757,24 @@ class Statistics:
         """Print confidence intervals for mean of each ingredient proportion"""
         total = sum(self.means)
         percentages = [(mean / total) * 100 for mean in self.means]
-        for percentage, interval, ingredient in zip(
-            percentages, self.intervals, self.ingredients, strict=False
+        for percentage, widths, ingredient in zip(
+            percentages, self.interval_widths(), self.ingredients, strict=False
         ):
-            self._print_interval(output, percentage, interval, ingredient)
+            self._print_interval(output, percentage, widths, ingredient)
+
+    def print_robust_statistics(self, output: Output) -> None:
+        """Print median, interquartile range and trimmed mean of each
+        ingredient proportion"""
+        if self.robust is None:
+            return
+        float_format = self._float_format()
+        for i, ingredient in enumerate(self.ingredients):
+            median = float_format % self.robust.medians[i]
+            lower = float_format % self.robust.lower_quartiles[i]
+            upper = float_format % self.robust.upper_quartiles[i]
+            trimmed = float_format % self.robust.trimmed_means[i]
+            output.line(
+                f"The {ingredient} proportion has a median of {median}%"
+                f" (interquartile range {lower}% to {upper}%,"
+                f" trimmed mean {trimmed}%)"
+            )
@@ -2,10 +2,12 @@
 
 import sys
 from optparse import OptionParser, Values
+from pathlib import Path
 
 import rational_recipes.errors
 import rational_recipes.utils as utils
 from rational_recipes import StatsMain
+from rational_recipes.cache import default_cache_dir
 
 
 def parse_command_line() -> tuple[
@@ -84,25 +86,128 @@ def parse_command_line() -> tuple[
         help="Ignore zero values where IGNOREZEROS is col,[col]",
         metavar="IGNOREZEROS",
     )
+    utils.add_jobs_option(parser, bootstrap=True)
+    parser.add_option(
+        "-s",
+        "--stream",
+        action="store_true",
+        dest="stream",
+        default=False,
+        help="read input line by line in constant memory (implies --include)",
+    )
+    parser.add_option(
+        "--cache-dir",
+        type="string",
+        dest="cache_dir",
+        default=None,
+        help="directory for cached conversions of input files (default is"
+        " $RATIONAL_RECIPES_CACHE or ~/.cache/rational_recipes)",
+        metavar="DIR",
+    )
+    parser.add_option(
+        "--no-cache",
+        action="store_false",
+        dest="use_cache",
+        default=True,
+        help="always parse input files instead of reusing cached conversions",
+    )
+    parser.add_option(
+        "-b",
+        "--bootstrap",
+        type="int",
+        dest="bootstrap",
+        default=0,
+        help="calculate bootstrap confidence intervals from RESAMPLES resamples"
+        " instead of the normal approximation",
+        metavar="RESAMPLES",
+    )
+    parser.add_option(
+        "--seed",
+        type="int",
+        dest="seed",
+        default=None,
+        help="random SEED for bootstrap resampling, for reproducible intervals,"
+        " and for the quantile sketch of --robust with --stream",
+        metavar="SEED",
+    )
+    parser.add_option(
+        "--robust",
+        action="store_true",
+        dest="robust",
+        default=False,
+        help="also output the median, interquartile range and trimmed mean of"
+        " each ingredient proportion (approximate with --stream)",
+    )
+    parser.add_option(
+        "--source-weights",
+        type="string",
+        dest="source_weights",
+        default=None,
+        help="weigh the recipes of each input file, where WEIGHTS is"
+        " weight[,weight] with one weight per file in order",
+        metavar="WEIGHTS",
+    )
+    parser.add_option(
+        "--float32",
+        action="store_true",
+        dest="float32",
+        default=False,
+        help="hold recipes in single precision, halving the matrix statistics are"
+        " calculated from (peak memory drops by about a quarter with -i, and"
+        " little when duplicates are removed)",
+    )
     options, filenames = parser.parse_args()
+    if options.stream and options.ignorezeros is not None:
+        parser.error("--stream cannot be combined with --ignore-zeros")
+    if options.stream and options.bootstrap:
+        parser.error("--stream cannot be combined with --bootstrap")
+    if options.bootstrap < 0:
+        parser.error("--bootstrap must be a positive number of resamples")
+    if options.stream and options.source_weights is not None:
+        parser.error("--stream cannot be combined with --source-weights")
     merge = utils.parse_column_merge(options.merge)
     restrictions = utils.parse_restrictions(options.restrictions)
     if len(filenames) < 1:
         parser.error("no input file provided")
+    try:
+        options.source_weights = utils.parse_source_weights(options.source_weights)
+    except rational_recipes.errors.InvalidInputException as e:
+        parser.error(str(e))
+    if options.source_weights is not None and len(options.source_weights) != len(
+        filenames
+    ):
+        parser.error("--source-weights needs one weight per input file")
     return filenames, options, merge, restrictions
 
 
 def run() -> None:
     """Run the stats tool from the command line."""
     filenames, options, merge, restrictions = parse_command_line()
-    distinct = options.distinct
+    distinct = options.distinct and not options.stream
 
     ignorezeros: list[str] = []
     if options.ignorezeros is not None:
         ignorezeros = options.ignorezeros.split(",")
 
+    cache_dir = None
+    if options.use_cache:
+        cache_dir = Path(options.cache_dir or default_cache_dir())
+
     try:
-        script = StatsMain(filenames, distinct, merge, ignorezeros)
+        script = StatsMain(
+            filenames,
+            distinct,
+            merge,
+            ignorezeros,
+            stream=options.stream,
+            jobs=options.jobs,
+            cache_dir=cache_dir,
+            bootstrap=options.bootstrap,
+            seed=options.seed,
+            robust=options.robust,
+            source_weights=options.source_weights,
+            float32=options.float32,
+        )
     except rational_recipes.errors.InvalidInputException as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -1,11 +1,13 @@
 """Statistical analysis of multiple recipes of the same type."""
 
 from dataclasses import dataclass
+from pathlib import Path
 
 import rational_recipes.utils as utils
 from rational_recipes.output import Output
+from rational_recipes.quantiles import TRIM
 from rational_recipes.ratio_format import RatioFormatter
-from rational_recipes.statistics import calculate_minimum_sample_sizes
+from rational_recipes.statistics import RobustStatistics, calculate_minimum_sample_sizes
 
 
 @dataclass
@@ -21,6 +23,7 @@ class StatsResult:
     recipe_weights: list[float]
     total_recipe_weight: float
     sample_size: int
+    robust: RobustStatistics | None = None
 
     def __str__(self) -> str:
         return self.output
@@ -35,13 +38,32 @@ class StatsMain:
         distinct: bool,
         merge: list[list[tuple[str | int, float]]],
         zero_columns: list[str],
+        stream: bool = False,
+        jobs: int = 1,
+        cache_dir: Path | None = None,
+        bootstrap: int = 0,
+        seed: int | None = None,
+        robust: bool = False,
+        source_weights: list[float] | None = None,
+        float32: bool = False,
     ) -> None:
         self.distinct = distinct
         self.confidence: float = 0.05
         self.restrictions: list[tuple[str | int, float]] = []
         self.formatter = RatioFormatter()
         result = utils.get_ratio_and_stats(
-            filenames, distinct, merge, zero_columns=zero_columns
+            filenames,
+            distinct,
+            merge,
+            zero_columns=zero_columns,
+            stream=stream,
+            jobs=jobs,
+            cache_dir=cache_dir,
+            bootstrap=bootstrap,
+            seed=seed,
+            robust=robust,
+            source_weights=source_weights,
+            float32=float32,
         )
         _: object
         _, self.ratio, self.stats, self.sample_size = result
@@ -69,6 +91,8 @@ class StatsMain:
         self.print_ratio(output)
         if verbose:
             self.print_confidence_intervals(output, self.confidence)
+        if self.stats.robust is not None:
+            self.print_robust_statistics(output)
         self.print_recipe(output, recipe_precision, total_recipe_weight)
         self.print_footer(output)
         return self._build_result(str(output), total_recipe_weight)
@@ -82,8 +106,10 @@ class StatsMain:
         total = sum(self.stats.means)
         proportions = [(m / total) * 100 for m in self.stats.means]
         intervals = [
-            (p - iv, p + iv)
-            for p, iv in zip(proportions, self.stats.intervals, strict=False)
+            (p - below, p + above)
+            for p, (below, above) in zip(
+                proportions, self.stats.interval_widths(), strict=False
+            )
         ]
         min_sample_sizes = list(
             calculate_minimum_sample_sizes(
@@ -102,6 +128,7 @@ class StatsMain:
             recipe_weights=recipe_weights,
             total_recipe_weight=weight,
             sample_size=self.sample_size,
+            robust=self.stats.robust,
         )
 
     def print_footer(self, output: Output) -> None:
@@ -110,6 +137,11 @@ class StatsMain:
         if self.distinct:
             text = "distinct recipe proportions. Duplicates have been removed."
         output.line(f"Note: these calculations are based on {self.sample_size} {text}")
+        if self.stats.effective_sample_size is not None:
+            output.line(
+                "Recipes are weighted by source, for an effective sample size of"
+                f" {self.stats.effective_sample_size:.1f}."
+            )
 
     def print_recipe(
         self, output: Output, recipe_precision: int, total_recipe_weight: float
@@ -135,7 +167,10 @@ class StatsMain:
             output.line("Too little data available to provide statistics.")
             output.line()
             return
-        output.title("Recipe ratio with confidence intervals (confidence level is 95%)")
+        kind = "confidence intervals"
+        if self.stats.bounds is not None:
+            kind = "bootstrap confidence intervals"
+        output.title(f"Recipe ratio with {kind} (confidence level is 95%)")
         self.stats.print_confidence_intervals(output)
         output.line()
         output.title(
@@ -145,3 +180,13 @@ class StatsMain:
         )
         self.stats.print_min_sample_sizes(output)
         output.line()
+
+    def print_robust_statistics(self, output: Output) -> None:
+        """Print median, interquartile range and trimmed mean of each
+        ingredient proportion"""
+        output.title(
+            "Ingredient proportions by median, interquartile range and"
+            f" {TRIM:.0%} trimmed mean"
+        )
+        self.stats.print_robust_statistics(output)
+        output.line()
@@ -0,0 +1,104 @@
+"""Stopping rule for recipe collection.
+
+Rather than collecting a fixed number of recipes per dish, collection stops
+once the confidence interval of every dominant ingredient proportion is
+narrow enough. The rule is checked after every collected recipe, so adding
+a recipe and checking only update running statistics, at a cost in the
+number of ingredients rather than the number of recipes collected.
+"""
+
+from collections.abc import Sequence
+from typing import NamedTuple
+
+import numpy
+
+from rational_recipes.columns import ColumnTranslator
+from rational_recipes.ingredient import Ingredient
+from rational_recipes.normalize import normalize_matrix_to_100g
+from rational_recipes.statistics import (
+    StatsAccumulator,
+    confidence_intervals,
+    minimum_sample_sizes,
+)
+
+# Mean share of the recipe weight, in percent, that makes an ingredient
+# dominant when the dominant ingredients are not given
+DOMINANT_PROPORTION = 10.0
+
+
+class StoppingReport(NamedTuple):
+    """How close the statistics of the recipes collected so far are to the
+    desired confidence interval"""
+
+    sample_size: int
+    # Half width of each ingredient's confidence interval relative to its
+    # mean, infinite for ingredients not used so far
+    relative_intervals: list[float]
+    # Further samples predicted to be needed for each ingredient
+    samples_needed: list[int]
+    dominant: list[int]
+    converged: bool
+
+
+class StoppingRule:
+    """Decides when enough recipes of a dish have been collected: when the
+    confidence intervals of the dominant ingredients are within
+    desired_interval of their means. Dominant ingredients are given as
+    column ids, or else are those with a mean of at least
+    DOMINANT_PROPORTION percent of the recipe. If no ingredient is that
+    large, the one with the largest mean is dominant."""
+
+    def __init__(
+        self,
+        ingredients: tuple[Ingredient, ...],
+        dominant: Sequence[str | int] | None = None,
+        desired_interval: float = 0.05,
+        accumulator: StatsAccumulator | None = None,
+    ) -> None:
+        self.ingredients = ingredients
+        self.desired_interval = desired_interval
+        self.dominant: list[int] | None = None
+        if dominant is not None:
+            translator = ColumnTranslator(ingredients)
+            self.dominant = sorted(
+                {
+                    index
+                    for column in dominant
+                    for index in translator.id_to_indexes(column)
+                }
+            )
+        if accumulator is None:
+            accumulator = StatsAccumulator(len(ingredients))
+        self.accumulator = accumulator
+
+    def add(self, grams: Sequence[float]) -> StoppingReport:
+        """Add one recipe in grams and check whether to stop"""
+        row = numpy.array(grams, dtype=numpy.float64, ndmin=2)
+        self.accumulator.add(normalize_matrix_to_100g(row, out=row)[0])
+        return self.report()
+
+    def report(self) -> StoppingReport:
+        """Check the recipes added so far"""
+        count = self.accumulator.count
+        means = self.accumulator.means
+        std_deviations = numpy.sqrt(self.accumulator.squares / max(count, 1))
+        intervals = confidence_intervals(std_deviations, max(count, 1))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            relative = numpy.where(means > 0, intervals / means, numpy.inf)
+        needed = minimum_sample_sizes(std_deviations, means, self.desired_interval)
+        dominant = self.dominant
+        if dominant is None:
+            dominant = numpy.flatnonzero(means >= DOMINANT_PROPORTION).tolist()
+        if len(dominant) == 0:
+            dominant = [int(numpy.argmax(means))]
+        # A single recipe has no spread to estimate an interval from
+        converged = count >= 2 and bool(
+            (relative[dominant] <= self.desired_interval).all()
+        )
+        return StoppingReport(
+            count,
+            relative.tolist(),
+            numpy.maximum(needed - count, 0).tolist(),
+            dominant,
+            converged,
+        )
@@ -4,6 +4,7 @@ to grams.
 
 from __future__ import annotations
 
+import hashlib
 from typing import TYPE_CHECKING
 
 from rational_recipes.errors import InvalidInputException
@@ -16,12 +17,16 @@ class Factory:
     """Registry and factory for all units of measure."""
 
     _UNITS: dict[str, Unit] = {}
+    _CODES: list[Unit] = []
 
     @classmethod
-    def register(cls, unit: Unit) -> None:
-        """Register unit name and synonyms"""
+    def register(cls, unit: Unit) -> int:
+        """Register unit name and synonyms. Returns the integer code assigned
+        to the unit, used to identify units in columnar measurement data."""
         for name in unit.synonyms():
             cls._UNITS[name.lower().strip()] = unit
+        cls._CODES.append(unit)
+        return len(cls._CODES) - 1
 
     @classmethod
     def get_by_name(cls, name: str) -> Unit | None:
@@ -31,13 +36,33 @@ class Factory:
         except KeyError:
             return None
 
+    @classmethod
+    def get_by_code(cls, code: int) -> Unit:
+        """Lookup a Unit instance by its integer code"""
+        return cls._CODES[code]
+
+    @classmethod
+    def get_all(cls) -> list[Unit]:
+        """All registered units, indexed by their integer code"""
+        return list(cls._CODES)
+
+    @classmethod
+    def fingerprint(cls) -> str:
+        """Digest of every registered unit with its code, names and
+        conversion, used to detect when cached conversions are stale"""
+        digest = hashlib.sha256()
+        for unit in cls._CODES:
+            description = (type(unit).__name__, sorted(vars(unit).items()))
+            digest.update(repr(description).encode())
+        return digest.hexdigest()
+
 
 class Unit:
     """Abstract unit of measure"""
 
     def __init__(self, names: list[str]) -> None:
         self._names = names
-        Factory.register(self)
+        self.code = Factory.register(self)
 
     def synonyms(self) -> list[str]:
         """List synonyms for a unit"""
@@ -49,6 +74,11 @@ class Unit:
         """Normalize an ingredient measure to grams"""
         raise NotImplementedError("Unit.norm() must be implemented in derived class")
 
+    def factor(self, ingredient: Ingredient) -> float | None:
+        """Grams per one of this unit for an ingredient, or None if the unit
+        cannot be used for the ingredient"""
+        raise NotImplementedError("Unit.factor() must be implemented in derived class")
+
 
 class WeightUnit(Unit):
     """Units of measure by weight"""
@@ -63,6 +93,10 @@ class WeightUnit(Unit):
         """Normalizes any weight unit to grams"""
         return value * self._conversion
 
+    def factor(self, ingredient: Ingredient) -> float | None:
+        """Grams per one of this unit"""
+        return self._conversion
+
 
 GRAM = WeightUnit(["gram", "grams", "g"], 1)
 HG = WeightUnit(["hg", "hectogram", "hectograms"], 100)
@@ -85,6 +119,10 @@ class VolumeUnit(Unit):
         milliliters = value * self._conversion
         return ingredient.milliliters2grams(milliliters)
 
+    def factor(self, ingredient: Ingredient) -> float | None:
+        """Grams per one of this unit, by the density of the ingredient"""
+        return ingredient.milliliters2grams(self._conversion)
+
 
 QUART = VolumeUnit(["quart", "quarts"], 946.353)
 US_PINT = VolumeUnit(["US pint", "pint", "pints", "pt", "us_pint"], 473.176)
@@ -152,6 +190,10 @@ class WholeUnit(Unit):
             )
         return value * conversion
 
+    def factor(self, ingredient: Ingredient) -> float | None:
+        """Weight of one of this size of the ingredient, if known"""
+        return ingredient.wholeunits2grams(self._size)
+
 
 XL = WholeUnit(["XL"])
 MEDIUM = WholeUnit(["MEDIUM", "US MEDIUM"])
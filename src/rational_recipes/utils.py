@@ -1,15 +1,29 @@
 """Functions for adding and parsing command line options"""
 
+import itertools
+from collections.abc import Sequence
 from optparse import OptionParser
-from typing import TextIO
+from pathlib import Path
+from typing import Any, Literal, TextIO
 
-from rational_recipes.errors import InvalidInputException
+import numpy
+import numpy.typing as npt
+
+from rational_recipes.cache import read_gram_matrices
+from rational_recipes.errors import InvalidArgumentException, InvalidInputException
 from rational_recipes.ingredient import Ingredient
-from rational_recipes.merge import merge_columns
-from rational_recipes.normalize import to_grams
+from rational_recipes.merge import Merge, merge_matrix_columns
+from rational_recipes.normalize import normalize_matrix_to_100g, to_grams
 from rational_recipes.ratio import Ratio
-from rational_recipes.read import read_files
-from rational_recipes.statistics import Statistics, calculate_statistics
+from rational_recipes.read import stream_files
+from rational_recipes.statistics import (
+    Statistics,
+    StatsAccumulator,
+    calculate_statistics,
+)
+
+# Rows converted and added to the statistics at a time when streaming
+STREAM_BATCH_SIZE = 4096
 
 
 def get_ratio_and_stats(
@@ -17,28 +31,166 @@ def get_ratio_and_stats(
     distinct: bool,
     merge: list[list[tuple[str | int, float]]],
     zero_columns: list[str] | None = None,
+    stream: bool = False,
+    jobs: int = 1,
+    cache_dir: Path | None = None,
+    bootstrap: int = 0,
+    seed: int | None = None,
+    robust: bool = False,
+    source_weights: Sequence[float] | None = None,
+    float32: bool = False,
 ) -> tuple[tuple[Ingredient, ...], Ratio, Statistics, int]:
-    """Parse input files to produce mean recipe ratio and related statistics"""
-    files: list[TextIO] = [open(filename) for filename in filenames]
-    ingredients, proportions = read_files(files)
-    proportions_grams = list(to_grams(ingredients, proportions))
+    """Parse input files to produce mean recipe ratio and related statistics.
+    Converted input files are cached in cache_dir when one is given. With
+    bootstrap resamples, confidence intervals are bootstrap intervals. With
+    robust, robust statistics are included, approximate when streaming.
+    With a weight per input file, its recipes are weighted accordingly.
+    With float32, recipes are held in single precision to save memory."""
+    if stream:
+        if distinct or zero_columns or bootstrap or source_weights is not None:
+            raise InvalidArgumentException(
+                "Streaming mode cannot remove duplicates, ignore zeros, bootstrap"
+                " or weight sources"
+            )
+        return get_streamed_ratio_and_stats(filenames, merge, robust, seed)
+    dtype = numpy.float32 if float32 else numpy.float64
+    ingredients, proportions_merged, weights = read_proportions(
+        filenames, distinct, merge, jobs, cache_dir, source_weights, dtype
+    )
+    if len(proportions_merged) == 0:
+        raise InvalidInputException("No recipes in input")
+    # The proportions are not used again, so they are normalized in place
+    statistics = calculate_statistics(
+        proportions_merged,
+        ingredients,
+        zero_columns,
+        bootstrap,
+        seed,
+        jobs,
+        robust,
+        weights,
+        dtype,
+        copy=False,
+    )
+    ratio = Ratio(ingredients, statistics.bakers_percentage())
+    return ingredients, ratio, statistics, len(proportions_merged)
+
+
+def read_proportions(
+    filenames: list[str],
+    distinct: bool,
+    merge: list[list[tuple[str | int, float]]],
+    jobs: int = 1,
+    cache_dir: Path | None = None,
+    source_weights: Sequence[float] | None = None,
+    dtype: npt.DTypeLike = numpy.float64,
+) -> tuple[
+    tuple[Ingredient, ...],
+    npt.NDArray[numpy.floating[Any]],
+    npt.NDArray[numpy.float64] | None,
+]:
+    """Parse input files into a matrix of recipes in grams, with duplicates
+    removed if distinct and columns merged. The files are copied into one
+    column-major matrix of dtype, ready for calculate_statistics. With a
+    weight per input file, the weight of each recipe is returned as well."""
+    if source_weights is not None and len(source_weights) != len(filenames):
+        raise InvalidArgumentException("Expected one source weight per input file")
+    ingredients, matrices = read_gram_matrices(filenames, jobs, cache_dir)
+    weights = None
+    if source_weights is not None:
+        weights = numpy.repeat(
+            numpy.asarray(source_weights, dtype=numpy.float64),
+            [len(matrix) for matrix in matrices],
+        )
+    proportions_grams: npt.NDArray[numpy.floating[Any]]
     if distinct:
-        proportions_grams = list(set(proportions_grams))
-    ingredients, proportions_merged = merge_columns(
+        # Duplicates are found in double precision, so that rows differing
+        # only below the precision of dtype are kept apart
+        rows, weights = distinct_rows(
+            stack_matrices(matrices, len(ingredients), numpy.float64, "C"), weights
+        )
+        proportions_grams = numpy.asarray(rows, dtype=dtype, order="F")
+        del rows
+    else:
+        proportions_grams = stack_matrices(matrices, len(ingredients), dtype, "F")
+    ingredients, proportions_merged = merge_matrix_columns(
         ingredients, proportions_grams, merge
     )
-    statistics = calculate_statistics(proportions_merged, ingredients, zero_columns)
+    return ingredients, proportions_merged, weights
+
+
+def stack_matrices(
+    matrices: list[npt.NDArray[numpy.float64]],
+    nr_columns: int,
+    dtype: npt.DTypeLike,
+    order: Literal["C", "F"],
+) -> npt.NDArray[numpy.floating[Any]]:
+    """Copy the rows of several matrices into one matrix of dtype and
+    layout order. Matrices are removed from the list once copied, so that
+    each is freed as soon as possible."""
+    stacked: npt.NDArray[numpy.floating[Any]] = numpy.empty(
+        (sum(map(len, matrices)), nr_columns), dtype=dtype, order=order
+    )
+    start = 0
+    matrices.reverse()
+    while len(matrices) > 0:
+        matrix = matrices.pop()
+        stacked[start : start + len(matrix)] = matrix
+        start += len(matrix)
+        del matrix
+    return stacked
+
+
+def distinct_rows[F: numpy.floating[Any]](
+    matrix: npt.NDArray[F],
+    weights: npt.NDArray[numpy.float64] | None = None,
+) -> tuple[npt.NDArray[F], npt.NDArray[numpy.float64] | None]:
+    """Remove duplicate rows from a matrix. A row that occurs with several
+    weights keeps the largest."""
+    if weights is None:
+        return numpy.unique(matrix, axis=0), None
+    rows, inverse = numpy.unique(matrix, axis=0, return_inverse=True)
+    row_weights = numpy.zeros(len(rows))
+    numpy.maximum.at(row_weights, inverse.ravel(), weights)
+    return rows, row_weights
+
+
+def get_streamed_ratio_and_stats(
+    filenames: list[str],
+    merge: list[list[tuple[str | int, float]]],
+    robust: bool = False,
+    seed: int | None = None,
+) -> tuple[tuple[Ingredient, ...], Ratio, Statistics, int]:
+    """Produce mean recipe ratio and related statistics reading the input
+    files line by line, so memory use does not grow with the input size.
+    The seed is that of the quantile sketch for robust statistics."""
+    files: list[TextIO] = [open(filename) for filename in filenames]
+    ingredients, proportions = stream_files(files)
+    proportions_grams = to_grams(ingredients, proportions)
+    if merge:
+        merger = Merge(merge, ingredients)
+        ingredients = merger.merge_ingredients(ingredients)
+        proportions_grams = merger.merge_rows(proportions_grams)
+    accumulator = StatsAccumulator(len(ingredients), robust, seed)
+    for rows in itertools.batched(proportions_grams, STREAM_BATCH_SIZE):
+        accumulator.add_batch(normalize_matrix_to_100g(numpy.array(rows)))
+    if accumulator.count == 0:
+        raise InvalidInputException("No recipes in input")
+    statistics = accumulator.statistics(ingredients)
     ratio = Ratio(ingredients, statistics.bakers_percentage())
-    return ingredients, ratio, statistics, len(proportions_merged)
+    return ingredients, ratio, statistics, accumulator.count
 
 
 def get_ratio(
     filenames: list[str],
     distinct: bool,
     merge: list[list[tuple[str | int, float]]],
+    jobs: int = 1,
 ) -> tuple[tuple[Ingredient, ...], Ratio]:
     """Parse input files to produce mean recipe ratio"""
-    ingredients, ratio, _, _ = get_ratio_and_stats(filenames, distinct, merge)
+    ingredients, ratio, _, _ = get_ratio_and_stats(
+        filenames, distinct, merge, jobs=jobs
+    )
     return ingredients, ratio
 
 
@@ -68,6 +220,24 @@ def add_include_option(parser: OptionParser) -> None:
     )
 
 
+def add_jobs_option(parser: OptionParser, bootstrap: bool = False) -> None:
+    """Add option used to parse input files, and with bootstrap also to
+    draw bootstrap resamples, in parallel"""
+    work = "parse up to N input files"
+    if bootstrap:
+        work += " and draw bootstrap resamples"
+    parser.add_option(
+        "-j",
+        "--jobs",
+        type="int",
+        dest="jobs",
+        default=1,
+        help=f"{work} in parallel worker processes, where 0 uses all cores"
+        " (default is %default)",
+        metavar="N",
+    )
+
+
 def parse_column_merge(
     merge_option: str | None,
 ) -> list[list[tuple[str | int, float]]]:
@@ -94,6 +264,21 @@ def parse_column_merge(
     return merge
 
 
+def parse_source_weights(options: str | None) -> list[float] | None:
+    """Parse specification of input file weights"""
+    if options is None:
+        return None
+    try:
+        weights = [float(weight) for weight in options.split(",")]
+    except ValueError as err:
+        raise InvalidInputException(f"Invalid source weights: {options}") from err
+    if any(weight < 0 for weight in weights) or not any(weights):
+        raise InvalidInputException(
+            "Source weights must not be negative and not all be zero"
+        )
+    return weights
+
+
 def parse_restrictions(
     options: str | None,
 ) -> list[tuple[str | int, float]]:
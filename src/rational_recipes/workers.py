@@ -0,0 +1,29 @@
+"""Pools of worker processes for parsing and resampling in parallel"""
+
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+
+def process_pool(
+    max_workers: int | None,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple[Any, ...] = (),
+) -> ProcessPoolExecutor:
+    """Pool of up to max_workers worker processes (all cores if None), each
+    calling initializer(*initargs) once when it starts.
+
+    Workers are started from a fresh interpreter instead of being forked.
+    A forked worker would inherit the parent's thread-local ingredient
+    database connection (see ingredient.Factory), and SQLite connections
+    must not be shared between processes.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(method),
+        initializer=initializer,
+        initargs=initargs,
+    )
@@ -0,0 +1,128 @@
+"""Tests for the on-disk cache of converted input files"""
+
+import os
+
+import numpy
+import pytest
+
+from rational_recipes import cache
+from rational_recipes.cache import (
+    cache_key,
+    load_gram_file,
+    prune_cache,
+    read_gram_files,
+)
+from rational_recipes.ingredient import Factory, Ingredient
+
+FLOUR = Factory.get_by_name("flour")
+SUGAR = Factory.get_by_name("sugar")
+
+
+def write_csv(tmp_path, name, contents):
+    """Write an input file and return its name"""
+    path = tmp_path / name
+    path.write_text(contents)
+    return str(path)
+
+
+class TestGramCache:
+    """Tests for caching of gram matrices"""
+
+    def test_second_read_uses_cache(self, tmp_path):
+        """A cached entry is written once and then reused"""
+        filename = write_csv(tmp_path, "a.csv", "Flour, Sugar\n1 cup,2g\n3 oz,0\n")
+        cache_dir = tmp_path / "cache"
+        header, grams = load_gram_file(filename, cache_dir)
+        entries = list(cache_dir.iterdir())
+        assert len(entries) == 1
+        cached_header, cached_grams = load_gram_file(filename, cache_dir)
+        assert cached_header == header == "Flour, Sugar"
+        numpy.testing.assert_array_equal(cached_grams, grams)
+        assert list(cache_dir.iterdir()) == entries
+
+    def test_changed_contents_change_key(self):
+        """Different file contents never share a cache entry"""
+        assert cache_key(b"Flour\n1g") != cache_key(b"Flour\n2g")
+        assert cache_key(b"Flour\n1g") == cache_key(b"Flour\n1g")
+
+    def test_unreadable_entry_is_replaced(self, tmp_path):
+        """A corrupt cache entry falls back to parsing the file"""
+        contents = "Flour, Sugar\n1g,2g\n"
+        filename = write_csv(tmp_path, "a.csv", contents)
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        (cache_dir / f"{cache_key(contents.encode())}.npz").write_bytes(b"junk")
+        _, grams = load_gram_file(filename, cache_dir)
+        assert grams.tolist() == [[1.0, 2.0]]
+
+    def test_truncated_entry_is_replaced(self, tmp_path):
+        """A cache entry cut short, e.g. by a full disk, falls back to
+        parsing the file"""
+        filename = write_csv(tmp_path, "a.csv", "Flour, Sugar\n1 cup,2g\n")
+        cache_dir = tmp_path / "cache"
+        _, grams = load_gram_file(filename, cache_dir)
+        (entry,) = cache_dir.iterdir()
+        contents = entry.read_bytes()
+        entry.write_bytes(contents[: len(contents) // 2])
+        _, reparsed = load_gram_file(filename, cache_dir)
+        numpy.testing.assert_array_equal(reparsed, grams)
+
+    def test_registered_ingredients_change_key(self):
+        """Registering an ingredient makes cached conversions stale"""
+        key = cache_key(b"Flour\n1 cup")
+        Factory.register(Ingredient(["cache_test_flour"], 0.5))
+        assert cache_key(b"Flour\n1 cup") != key
+
+    def test_write_failure_only_warns(self, tmp_path):
+        """A cache directory that cannot be created falls back to parsing"""
+        filename = write_csv(tmp_path, "a.csv", "Flour, Sugar\n1g,2g\n")
+        not_a_dir = tmp_path / "file"
+        not_a_dir.write_text("")
+        with pytest.warns(RuntimeWarning, match="Could not write cache entry"):
+            _, grams = load_gram_file(filename, not_a_dir / "cache")
+        assert grams.tolist() == [[1.0, 2.0]]
+
+    def test_least_recently_used_entries_are_pruned(self, tmp_path):
+        """Pruning removes the oldest entries until the rest fit"""
+        for age, name in enumerate(["new", "middle", "old"]):
+            path = tmp_path / f"{name}.npz"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 - age, 1000 - age))
+        (tmp_path / "other").write_bytes(b"x" * 1000)
+        prune_cache(tmp_path, 250)
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "middle.npz",
+            "new.npz",
+            "other",
+        ]
+
+    def test_store_keeps_cache_within_limit(self, tmp_path, monkeypatch):
+        """Writing an entry prunes older entries beyond the size limit"""
+        cache_dir = tmp_path / "cache"
+        first = write_csv(tmp_path, "a.csv", "Flour, Sugar\n1g,2g\n")
+        load_gram_file(first, cache_dir)
+        (old_entry,) = cache_dir.iterdir()
+        os.utime(old_entry, (0, 0))
+        monkeypatch.setattr(cache, "CACHE_SIZE_LIMIT", old_entry.stat().st_size)
+        second = write_csv(tmp_path, "b.csv", "Flour, Sugar\n3g,4g\n")
+        load_gram_file(second, cache_dir)
+        (entry,) = cache_dir.iterdir()
+        assert entry != old_entry
+
+    def test_registered_ingredients_in_workers(self, tmp_path):
+        """Worker processes convert with the registered ingredients"""
+        Factory.register(Ingredient(["cache_worker_flour"], 0.5))
+        contents = "Cache_worker_flour, Sugar\n1 cup,2g\n"
+        files = [write_csv(tmp_path, name, contents) for name in ("a.csv", "b.csv")]
+        _, grams = read_gram_files(files)
+        _, parallel_grams = read_gram_files(files, jobs=2)
+        numpy.testing.assert_array_equal(parallel_grams, grams)
+
+    def test_read_gram_files(self, tmp_path):
+        """Files are combined in order with or without the cache"""
+        first = write_csv(tmp_path, "a.csv", "Flour, Sugar\n1g,2g\n")
+        second = write_csv(tmp_path, "b.csv", "Flour, Sugar\n3g,4g\n")
+        for cache_dir in (None, tmp_path / "cache", tmp_path / "cache"):
+            ingredients, grams = read_gram_files([first, second], cache_dir=cache_dir)
+            assert ingredients == (FLOUR, SUGAR)
+            assert grams.tolist() == [[1.0, 2.0], [3.0, 4.0]]
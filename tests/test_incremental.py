@@ -0,0 +1,119 @@
+"""Tests for incremental reading of growing input files"""
+
+import pytest
+
+from rational_recipes.errors import InvalidInputException
+from rational_recipes.incremental import TailReader
+from rational_recipes.statistics import calculate_statistics
+
+HEADER = "Flour, Sugar, Butter\n"
+ROWS = ["100g,50g,50g\n", "200g,50g,100g\n", "1 cup,2 oz,3 tbsp\n", "90g,0,30g\n"]
+
+
+def assert_same_statistics(state, rows, tmp_path):
+    """The incremental statistics match a full parse of the given rows"""
+    path = tmp_path / "full.csv"
+    path.write_text(HEADER + "".join(rows))
+    full = TailReader().update(str(path))
+    assert state.rows == full.rows == len(rows)
+    assert state.statistics().means == pytest.approx(full.statistics().means)
+    assert state.statistics().intervals == pytest.approx(full.statistics().intervals)
+
+
+class TestTailReader:
+    """Tests for TailReader"""
+
+    def test_appended_rows_are_folded_in(self, tmp_path):
+        """Only appended rows are parsed, and statistics cover all rows"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + "".join(ROWS[:2]))
+        reader = TailReader()
+        state = reader.update(str(path))
+        assert state.rows == 2
+        offset = state.offset
+        with open(path, "a") as csv_file:
+            csv_file.write("".join(ROWS[2:]))
+        state = reader.update(str(path))
+        assert state.offset > offset
+        assert_same_statistics(state, ROWS, tmp_path)
+
+    def test_matches_calculate_statistics(self, tmp_path):
+        """Statistics agree with the in-memory pipeline"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + "100g,50g,50g\n200g,50g,100g\n")
+        stats = TailReader().update(str(path)).statistics()
+        expected = calculate_statistics(
+            [(100, 50, 50), (200, 50, 100)], stats.ingredients, None
+        )
+        assert stats.means == pytest.approx(expected.means)
+        assert stats.std_deviations == pytest.approx(expected.std_deviations)
+
+    def test_partial_line_waits_for_newline(self, tmp_path):
+        """A row that is still being written is read by a later update"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + ROWS[0] + "200g,50g")
+        reader = TailReader()
+        assert reader.update(str(path)).rows == 1
+        with open(path, "a") as csv_file:
+            csv_file.write(",100g\n")
+        state = reader.update(str(path))
+        assert_same_statistics(state, ROWS[:2], tmp_path)
+
+    def test_truncated_file_is_reparsed(self, tmp_path):
+        """A file that shrinks is read again from the start"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + "".join(ROWS))
+        reader = TailReader()
+        reader.update(str(path))
+        path.write_text(HEADER + ROWS[3])
+        state = reader.update(str(path))
+        assert_same_statistics(state, ROWS[3:], tmp_path)
+
+    def test_rewritten_file_is_reparsed(self, tmp_path):
+        """A file rewritten with different earlier rows is read again"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + "".join(ROWS[:2]))
+        reader = TailReader()
+        reader.update(str(path))
+        rows = [ROWS[2], ROWS[1], ROWS[3]]
+        path.write_text(HEADER + "".join(rows))
+        state = reader.update(str(path))
+        assert_same_statistics(state, rows, tmp_path)
+
+    def test_error_reports_file_line(self, tmp_path):
+        """Errors in appended rows give the line number within the file"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + "".join(ROWS[:2]))
+        reader = TailReader()
+        reader.update(str(path))
+        with open(path, "a") as csv_file:
+            csv_file.write("1g,2g\n")
+        with pytest.raises(InvalidInputException) as exc_info:
+            reader.update(str(path))
+        assert str(exc_info.value) == (
+            "The row on line 4 has 2 columns where 3 were expected"
+        )
+
+    def test_fixed_file_is_read_after_error(self, tmp_path):
+        """A bad row in the first read leaves nothing behind, so the file
+        is read from its header once it has been fixed"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + ROWS[0] + "1g,x,2g\n")
+        reader = TailReader()
+        with pytest.raises(InvalidInputException):
+            reader.update(str(path))
+        path.write_text(HEADER + "".join(ROWS[:2]))
+        state = reader.update(str(path))
+        assert_same_statistics(state, ROWS[:2], tmp_path)
+
+    def test_merge(self, tmp_path):
+        """Columns are merged before statistics are accumulated"""
+        path = tmp_path / "variant.csv"
+        path.write_text(HEADER + "".join(ROWS))
+        state = TailReader([[("sugar", 1.0), ("butter", 1.0)]]).update(str(path))
+        stats = state.statistics()
+        assert [str(ingredient) for ingredient in stats.ingredients] == [
+            "flour",
+            "sugar",
+        ]
+        assert sum(stats.means) == pytest.approx(100.0)
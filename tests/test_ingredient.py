@@ -1,8 +1,22 @@
 """Unit tests for ingredient classes"""
 
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
-from rational_recipes.ingredient import Factory, Ingredient
+from rational_recipes import ingredient
+from rational_recipes.ingredient import (
+    Factory,
+    Ingredient,
+    _read_food_data,
+    build_lookup_table,
+    build_search_index,
+)
+from rational_recipes.read import read_measure_files
 
 EGG = Factory.get_by_name("egg")
 FLOUR = Factory.get_by_name("flour")
@@ -63,3 +77,323 @@ class TestDensityTransparency:
         """Egg should have a known density source"""
         assert EGG.density_source in ("fdc_derived", "supplementary", "fao")
         assert EGG.density > 0
+
+
+class TestGetMany:
+    """Tests for batch lookup of ingredients"""
+
+    def test_cold_lookup_uses_one_query_per_table(self) -> None:
+        """Uncached names are resolved with four queries in total"""
+        statements: list[str] = []
+        conn = Factory._get_conn()
+        conn.set_trace_callback(statements.append)
+        try:
+            ingredients = Factory.get_many(["Cardamom", "nutmeg", "molasses", "oats"])
+        finally:
+            conn.set_trace_callback(None)
+        assert [str(ingredient) for ingredient in ingredients] == [
+            "cardamom",
+            "nutmeg",
+            "molasses",
+            "oats",
+        ]
+        assert len(statements) == 4
+
+    def test_same_instances_as_get_by_name(self) -> None:
+        """Batch and single lookups share cached instances"""
+        ingredients = Factory.get_many(["flour", "EGG", " flour "])
+        assert ingredients == (FLOUR, EGG, FLOUR)
+
+    def test_unknown_name(self) -> None:
+        """The first unknown name raises KeyError as get_by_name does"""
+        with pytest.raises(KeyError) as exc_info:
+            Factory.get_many(["flour", "no_such_ingredient_xyz"])
+        assert exc_info.value.args[0] == "no_such_ingredient_xyz"
+
+
+class TestSnapshot:
+    """Tests for lookups from the preloaded snapshot"""
+
+    def test_lookups_do_not_query(self) -> None:
+        """With a snapshot loaded, uncached names need no queries"""
+        statements: list[str] = []
+        Factory.load_snapshot()
+        conn = Factory._get_conn()
+        conn.set_trace_callback(statements.append)
+        try:
+            tempeh, ricotta = Factory.get_many(["tempeh", "ricotta"])
+            with pytest.raises(KeyError) as exc_info:
+                Factory.get_by_name("brown suga")
+        finally:
+            conn.set_trace_callback(None)
+            Factory.drop_snapshot()
+        assert statements == []
+        assert (str(tempeh), str(ricotta)) == ("tempeh", "ricotta")
+        assert "brown sugar" in exc_info.value.args[0]
+
+    def test_same_data_as_database(self) -> None:
+        """The snapshot holds the same rows as a lookup query"""
+        conn = Factory._get_conn()
+        queried = _read_food_data(conn, ["blueberries"])
+        snapshot = _read_food_data(conn, None)
+        food_id, food_name = queried.foods["blueberries"]
+        assert snapshot.foods["blueberries"] == (food_id, food_name)
+        assert snapshot.densities[food_id] == queried.densities[food_id]
+        assert snapshot.synonyms[food_id] == queried.synonyms[food_id]
+        assert snapshot.portions[food_id] == queried.portions[food_id]
+
+
+@pytest.fixture
+def empty_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Start from an empty ingredient cache, restored afterwards"""
+    monkeypatch.setattr(Factory, "_INGREDIENTS", {})
+    monkeypatch.setattr(Factory, "_RECENT", OrderedDict())
+    monkeypatch.setattr(Factory, "_PINNED", set())
+    monkeypatch.setattr(Factory, "_REGISTERED", [])
+    for counter in ["_hits", "_misses", "_evictions"]:
+        monkeypatch.setattr(Factory, counter, 0)
+
+
+@pytest.fixture(scope="module")
+def built_copy() -> Iterator[sqlite3.Connection]:
+    """In-memory copy of the database with the optional tables built"""
+    conn = sqlite3.connect(":memory:")
+    Factory._get_conn().backup(conn)
+    build_search_index(conn)
+    build_lookup_table(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def built_db(
+    built_copy: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch
+) -> sqlite3.Connection:
+    """Look up ingredients in the copy with the optional tables built"""
+    monkeypatch.setattr(ingredient, "_connect", lambda: built_copy)
+    monkeypatch.setattr(Factory._local, "tables", frozenset())
+    monkeypatch.delattr(Factory._local, "conn")
+    return built_copy
+
+
+class TestSearchIndex:
+    """Tests for suggestions from the trigram search index"""
+
+    def test_suggestions_use_index(self, built_db: sqlite3.Connection) -> None:
+        """Suggestions are found with a full-text query"""
+        statements: list[str] = []
+        built_db.set_trace_callback(statements.append)
+        suggestions = Factory._suggest("brown suga")
+        built_db.set_trace_callback(None)
+        assert "brown sugar" in suggestions
+        assert any("MATCH" in statement for statement in statements)
+
+    def test_same_matches_as_scan(
+        self, built_db: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """The index finds the same names as scanning the tables"""
+        indexed = Factory._suggest("brown sug", limit=10000)
+        monkeypatch.setattr(Factory._local, "tables", frozenset())
+        scanned = Factory._suggest("brown sug", limit=10000)
+        assert indexed
+        assert sorted(indexed) == sorted(scanned)
+
+    def test_short_words(self, built_db: sqlite3.Connection) -> None:
+        """Words shorter than a trigram still filter the matches"""
+        suggestions = Factory._suggest("sugar br", limit=10000)
+        assert suggestions
+        assert all("br" in name.lower() for name in suggestions)
+
+
+class TestMissCache:
+    """Tests for caching of unknown ingredient names"""
+
+    @pytest.fixture(autouse=True)
+    def clear_misses(self) -> Iterator[None]:
+        Factory.clear_miss_cache()
+        yield
+        Factory.clear_miss_cache()
+
+    def test_repeat_miss_does_not_query(self) -> None:
+        """A known unknown name raises the same error without queries"""
+        with pytest.raises(KeyError) as first:
+            Factory.get_by_name("brown suga")
+        statements: list[str] = []
+        conn = Factory._get_conn()
+        conn.set_trace_callback(statements.append)
+        try:
+            with pytest.raises(KeyError) as second:
+                Factory.get_by_name(" Brown Suga")
+            with pytest.raises(KeyError):
+                Factory.get_many(["flour", "brown suga"])
+        finally:
+            conn.set_trace_callback(None)
+        assert statements == []
+        assert "brown sugar" in first.value.args[0]
+        assert second.value.args[0].startswith("' Brown Suga'")
+        assert Factory.miss_cache_info() == (2, 1, ingredient.MISS_CACHE_SIZE, 1)
+
+    def test_bounded(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """The least recently used names are evicted"""
+        monkeypatch.setattr(ingredient, "MISS_CACHE_SIZE", 2)
+        for name in ["no_such_a", "no_such_b", "no_such_a", "no_such_c"]:
+            with pytest.raises(KeyError):
+                Factory.get_by_name(name)
+        assert list(Factory._MISSES) == ["no_such_a", "no_such_c"]
+        assert Factory.miss_cache_info() == (1, 3, 2, 2)
+
+    @pytest.mark.usefixtures("empty_cache")
+    def test_database_change(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Unknown names and loaded ingredients are forgotten, and
+        connections reopened, when the database changes"""
+        monkeypatch.setattr(Factory, "_db_fingerprint", Factory._db_fingerprint)
+        with pytest.raises(KeyError):
+            Factory.get_by_name("no_such_a")
+        nutmeg = Factory.get_by_name("nutmeg")
+        conn = Factory._get_conn()
+        monkeypatch.setattr(ingredient, "db_fingerprint", lambda: "changed")
+        with pytest.raises(KeyError):
+            Factory.get_by_name("no_such_a")
+        assert Factory.miss_cache_info().hits == 0
+        assert "nutmeg" not in Factory._INGREDIENTS
+        reloaded = Factory.get_by_name("nutmeg")
+        assert reloaded is not nutmeg and reloaded == nutmeg
+        assert Factory._get_conn() is not conn
+
+    @pytest.mark.usefixtures("empty_cache")
+    def test_register(self) -> None:
+        """Registering an ingredient replaces a cached miss"""
+        with pytest.raises(KeyError):
+            Factory.get_by_name("no_such_flour")
+        Factory.register(Ingredient(["no_such_flour"], 0.5))
+        assert str(Factory.get_by_name("no_such_flour")) == "no_such_flour"
+
+
+class TestThreads:
+    """Tests for lookups from several threads"""
+
+    def test_connection_per_thread(self) -> None:
+        """Each thread has its own read-only connection"""
+        barrier = threading.Barrier(2)
+
+        def connect() -> sqlite3.Connection:
+            barrier.wait()
+            return Factory._get_conn()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first, second = executor.map(lambda _: connect(), range(2))
+        assert first is not second
+        assert Factory._get_conn() not in (first, second)
+        with pytest.raises(sqlite3.OperationalError):
+            Factory._get_conn().execute("DELETE FROM food")
+
+    @pytest.mark.usefixtures("empty_cache")
+    def test_concurrent_lookups(self) -> None:
+        """Concurrent cold lookups share one instance per food"""
+        names = ["nutmeg", "oats", "molasses", "ground nutmeg", "tempeh"] * 40
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resolved = list(executor.map(Factory.get_by_name, names))
+        for name, found in zip(names, resolved, strict=True):
+            assert found is Factory.get_by_name(name)
+
+
+@pytest.mark.usefixtures("empty_cache")
+class TestIngredientCache:
+    """Tests for the bounded ingredient cache"""
+
+    def test_evicts_least_recently_used(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """The least recently used ingredient is evicted with all its names"""
+        monkeypatch.setattr(ingredient, "INGREDIENT_CACHE_SIZE", 2)
+        nutmeg = Factory.get_by_name("nutmeg")
+        oats = Factory.get_by_name("oats")
+        assert Factory.get_by_name("nutmeg") is nutmeg
+        Factory.get_by_name("molasses")
+        assert oats not in Factory._RECENT
+        assert oats not in Factory._INGREDIENTS.values()
+        assert Factory.get_by_name("nutmeg") is nutmeg
+        assert Factory.cache_info() == (2, 3, 1, 2, 2)
+
+    def test_reloaded_ingredient_is_equal(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path
+    ) -> None:
+        """An ingredient loaded again after eviction equals the evicted
+        one, so headers read before and after still match"""
+        monkeypatch.setattr(ingredient, "INGREDIENT_CACHE_SIZE", 1)
+        path = tmp_path / "nutmeg.csv"
+        path.write_text("Nutmeg, Oats\n1g,2g\n")
+        first = read_measure_files([str(path)])[0]
+        Factory.get_by_name("molasses")
+        second = read_measure_files([str(path)])[0]
+        assert second[0] is not first[0]
+        assert second == first
+        assert hash(second[0]) == hash(first[0])
+        assert read_measure_files([str(path), str(path)])[0] == first
+        assert Factory.get_by_name("oats") != Factory.get_by_name("molasses")
+        assert Ingredient(["nutmeg"], 1.0) != first[0]
+
+    def test_get_cached(self) -> None:
+        """Cached lookups never load from the database"""
+        assert Factory.get_cached("nutmeg") is None
+        nutmeg = Factory.get_by_name("nutmeg")
+        assert Factory.get_cached(" Nutmeg") is nutmeg
+        assert Factory.get_cached("oats") is None
+        assert Factory.cache_info().misses == 1
+
+    def test_registered_are_pinned(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Registered ingredients are never evicted"""
+        monkeypatch.setattr(ingredient, "INGREDIENT_CACHE_SIZE", 1)
+        custom = Ingredient(["no_such_custom", "nutmeg"], 0.5)
+        Factory.register(custom)
+        Factory.get_many(["oats", "molasses", "tempeh"])
+        assert Factory.get_by_name("no_such_custom") is custom
+        assert Factory.get_by_name("nutmeg") is custom
+        assert Factory.cache_info().currsize == 1
+
+    def test_clear_keeps_registered(self) -> None:
+        """Clearing the cache keeps registered ingredients"""
+        custom = Ingredient(["no_such_custom"], 0.5)
+        Factory.register(custom)
+        Factory.get_by_name("oats")
+        Factory.clear_cache()
+        assert list(Factory._INGREDIENTS) == ["no_such_custom"]
+        assert Factory.cache_info() == (0, 0, 0, ingredient.INGREDIENT_CACHE_SIZE, 0)
+
+
+class TestLookupTable:
+    """Tests for lookups from the denormalised ingredient table"""
+
+    @pytest.mark.usefixtures("empty_cache")
+    def test_cold_lookup_uses_one_query(self, built_db: sqlite3.Connection) -> None:
+        """Uncached names are resolved with a single query"""
+        assert Factory._get_conn() is built_db
+        statements: list[str] = []
+        built_db.set_trace_callback(statements.append)
+        ingredients = Factory.get_many(["Cardamom", "nutmeg", "molasses", "oats"])
+        built_db.set_trace_callback(None)
+        assert [str(found) for found in ingredients] == [
+            "cardamom",
+            "nutmeg",
+            "molasses",
+            "oats",
+        ]
+        assert len(statements) == 1
+
+    def test_same_as_food_tables(self, built_db: sqlite3.Connection) -> None:
+        """The table holds the ingredients built from the food tables"""
+        names = [
+            row[0].lower()
+            for row in built_db.execute("SELECT name FROM synonym ORDER BY id")
+        ]
+        from_table = ingredient._read_lookup_table(built_db, names)
+        data = _read_food_data(built_db, names)
+        for name, found in from_table.items():
+            food_id, food_name = data.foods[name]
+            expected = ingredient._build_ingredient(
+                name,
+                food_name,
+                data.densities.get(food_id, []),
+                data.synonyms.get(food_id, []),
+                data.portions.get(food_id, []),
+            )
+            assert vars(found) == vars(expected)
+        assert from_table.keys() == data.foods.keys()
@@ -1,11 +1,16 @@
 """Test column merge"""
 
+import numpy
 import pytest
 from numpy import array
 
 from rational_recipes.errors import InvalidInputException
 from rational_recipes.ingredient import Factory
-from rational_recipes.merge import MergeConfigError, merge_columns
+from rational_recipes.merge import (
+    MergeConfigError,
+    merge_columns,
+    merge_matrix_columns,
+)
 
 BUTTER = Factory.get_by_name("butter")
 FLOUR = Factory.get_by_name("flour")
@@ -182,3 +187,35 @@ class TestMerge:
                 merge=[((1, 1.0), (2, 1.0)), (("error", 1.0), (4, 1.0))],
             )
         assert str(exc_info.value) == "Missing column specified: 'error'"
+
+
+class TestMergeMatrix:
+    """Test column merge of measurement matrices"""
+
+    def test_matches_row_merge(self):
+        """Matrix merge gives the same result as the row based merge"""
+        ingredients = (FLOUR, SUGAR, BUTTER, SALT, WATER)
+        matrix = array([[1.0, 2.0, 3.0, 4.0, 5.0], [6.0, 7.0, 8.0, 9.0, 10.0]])
+        merge = [[("butter", 0.84), ("salt", 0.5)], [("sugar", 1.0), ("water", 1.0)]]
+        expected_ingredients, expected = merge_columns(
+            ingredients, [tuple(row) for row in matrix], merge
+        )
+        new_ingredients, merged = merge_matrix_columns(ingredients, matrix, merge)
+        assert new_ingredients == expected_ingredients
+        numpy.testing.assert_allclose(merged, expected)
+
+    def test_keeps_type_and_layout(self):
+        """A column-major float32 matrix stays one"""
+        matrix = numpy.asfortranarray([[1.0, 2.0, 3.0]], dtype=numpy.float32)
+        _, merged = merge_matrix_columns(
+            (FLOUR, SUGAR, BUTTER), matrix, [[("flour", 1.0), ("sugar", 1.0)]]
+        )
+        assert merged.dtype == numpy.float32
+        assert merged.flags.f_contiguous
+        assert merged.tolist() == [[3.0, 3.0]]
+
+    def test_no_merge_returns_input(self):
+        """Without a merge specification the matrix is returned unchanged"""
+        matrix = array([[1.0, 2.0]])
+        _, merged = merge_matrix_columns((FLOUR, SUGAR), matrix, [])
+        assert merged is matrix
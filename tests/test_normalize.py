@@ -1,9 +1,19 @@
 """Tests for data normalization"""
 
+from io import StringIO
+
+import numpy
 import pytest
 
 from rational_recipes.ingredient import Factory
-from rational_recipes.normalize import normalize_to_100g
+from rational_recipes.normalize import (
+    conversion_table,
+    measures_to_grams,
+    normalize_matrix_to_100g,
+    normalize_to_100g,
+    to_grams,
+)
+from rational_recipes.read import read_measures, read_rows
 from rational_recipes.units import (
     DASH,
     DSTSPN,
@@ -28,6 +38,7 @@ from rational_recipes.units import (
     US_PINT,
     BadUnitException,
 )
+from rational_recipes.units import Factory as UnitFactory
 from tests.test_utils import norm, normalize
 
 BUTTER = Factory.get_by_name("butter")
@@ -218,3 +229,69 @@ class TestNormalizeColumns:
         assert new_columns[0][1] == pytest.approx(63.32, abs=1e-1)
         assert new_columns[0][2] == pytest.approx(17.05, abs=1e-1)
         assert new_columns[0][3] == pytest.approx(2.73, abs=1e-1)
+
+    def test_normalize_matrix_to_100g(self):
+        """Every row of a matrix is scaled to 100g, optionally in place"""
+        data = numpy.array([[1.0, 3.75, 1.01, 0.16], [2.0, 2.0, 0.0, 0.0]])
+        expected = list(normalize_to_100g(data.tolist()))
+        numpy.testing.assert_allclose(normalize_matrix_to_100g(data), expected)
+        assert data[1, 0] == 2.0
+        normalize_matrix_to_100g(data, out=data)
+        numpy.testing.assert_allclose(data, expected)
+
+    def test_normalize_matrix_row_of_zeros(self):
+        """A row of zeros cannot be normalized"""
+        with pytest.raises(ZeroDivisionError):
+            normalize_matrix_to_100g(numpy.array([[1.0, 2.0], [0.0, 0.0]]))
+
+
+class TestMeasuresToGrams:
+    """Test columnar conversion of measure matrices to grams"""
+
+    CSV = """flour, butter, egg
+             7 oz, 1 stick, 1 large
+             1 cup, 2 tbsp, 2 medium
+             200 g, 0, 1 small"""
+
+    def test_matches_row_conversion(self):
+        """Columnar conversion agrees with the per-cell conversion"""
+        ingredients, measures = read_measures([StringIO(self.CSV)])
+        header, *rows = [line.strip() for line in self.CSV.splitlines()]
+        expected = list(to_grams(ingredients, read_rows(rows, len(ingredients))))
+        grams = measures_to_grams(ingredients, measures)
+        numpy.testing.assert_allclose(grams, expected)
+
+    def test_inapplicable_unit_reports_first_line(self):
+        """The earliest offending row is reported, whichever column it is in"""
+        recipes = """flour, salt
+                     1 cup, 1 g
+                     1 cup, 1 stick
+                     1 large, 1 g"""
+        ingredients, measures = read_measures([StringIO(recipes)])
+        with pytest.raises(BadUnitException) as exc_info:
+            measures_to_grams(ingredients, measures)
+        assert str(exc_info.value) == (
+            "Inapplicable unit 'stick' used for ingredient 'salt' at line 3"
+        )
+
+    def test_same_line_reports_first_column(self):
+        """Errors on one line are reported for the leftmost column"""
+        recipes = """flour, salt
+                     1 cup, 1 g
+                     1 large, 1 stick"""
+        ingredients, measures = read_measures([StringIO(recipes)])
+        with pytest.raises(BadUnitException) as exc_info:
+            measures_to_grams(ingredients, measures, first_line_nr=10)
+        assert str(exc_info.value) == (
+            "Inapplicable unit 'LARGE' used for ingredient 'flour' at line 11"
+        )
+
+    def test_conversion_table(self):
+        """The table holds grams per unit, or NaN for inapplicable units"""
+        table = conversion_table((BUTTER, EGG))
+        assert table.shape == (2, len(UnitFactory.get_all()))
+        assert table[0, GRAM.code] == table[1, GRAM.code] == 1
+        assert table[0, ML.code] == BUTTER.milliliters2grams(1)
+        assert table[0, STICK.code] == BUTTER.wholeunits2grams("stick")
+        assert numpy.isnan(table[0, LARGE.code])
+        assert table[1, LARGE.code] == EGG.wholeunits2grams("large")
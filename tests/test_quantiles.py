@@ -0,0 +1,138 @@
+"""Tests for exact quantiles and quantile sketches"""
+
+import numpy
+import pytest
+
+from rational_recipes.quantiles import (
+    QUARTILES,
+    QuantileSketch,
+    exact_quantiles,
+    exact_trimmed_means,
+    weighted_quantiles,
+    weighted_trimmed_means,
+)
+
+
+def ranks(data, quantiles):
+    """Share of each column's values below its estimated quantiles"""
+    ordered = numpy.sort(data, axis=0)
+    return numpy.array(
+        [
+            numpy.searchsorted(ordered[:, i], quantiles[:, i]) / len(data)
+            for i in range(data.shape[1])
+        ]
+    ).T
+
+
+class TestExact:
+    """Tests for exact_quantiles and exact_trimmed_means"""
+
+    def test_quartiles(self):
+        """Quartiles interpolate between ranks"""
+        data = numpy.array([[1.0, 10.0], [2.0, 0.0], [3.0, 30.0], [4.0, 20.0]])
+        quartiles = exact_quantiles(data, QUARTILES)
+        assert quartiles[:, 0].tolist() == [1.75, 2.5, 3.25]
+        assert quartiles[:, 1].tolist() == [7.5, 15.0, 22.5]
+
+    def test_trimmed_means(self):
+        """The lowest and highest tenth of values are left out"""
+        column = numpy.arange(20.0)
+        column[-1] = 1000.0
+        means = exact_trimmed_means(column[:, numpy.newaxis])
+        assert means[0] == pytest.approx(numpy.arange(2.0, 18.0).mean())
+
+    def test_few_rows_not_trimmed(self):
+        """Fewer than ten rows have nothing to cut"""
+        data = numpy.array([[1.0], [2.0], [9.0]])
+        assert exact_trimmed_means(data)[0] == pytest.approx(4.0)
+
+
+class TestWeighted:
+    """Tests for weighted_quantiles and weighted_trimmed_means"""
+
+    def test_equal_weights_match_exact(self):
+        """Equal weights give the same quantiles and trimmed means as no
+        weights, whatever their scale"""
+        data = numpy.random.default_rng(8).random((33, 2))
+        for weights in (numpy.ones(33), numpy.full(33, 2.5)):
+            assert weighted_quantiles(data, weights, QUARTILES) == pytest.approx(
+                exact_quantiles(data, QUARTILES)
+            )
+            assert weighted_trimmed_means(data, weights) == pytest.approx(
+                exact_trimmed_means(data)
+            )
+        median = weighted_quantiles(
+            numpy.array([[1.0], [2.0], [3.0], [4.0]]), numpy.ones(4), [0.5]
+        )
+        assert median.tolist() == [[2.5]]
+
+    def test_zero_weights_ignore_rows(self):
+        """Rows of zero weight make no difference"""
+        rng = numpy.random.default_rng(9)
+        data = rng.random((30, 2))
+        weights = rng.integers(0, 4, 30).astype(float)
+        used = weights > 0
+        assert weighted_quantiles(data, weights, QUARTILES) == pytest.approx(
+            weighted_quantiles(data[used], weights[used], QUARTILES)
+        )
+        assert (
+            weighted_quantiles(data, numpy.eye(30)[4], [0.1, 0.9]).tolist()
+            == [data[4].tolist()] * 2
+        )
+
+    def test_integer_weights_repeat_rows_in_means(self):
+        """Weighting a row by n is the same as repeating it n times"""
+        rng = numpy.random.default_rng(8)
+        data = rng.random((30, 2))
+        weights = rng.integers(0, 4, 30)
+        repeated = numpy.repeat(data, weights, axis=0)
+        means = weighted_trimmed_means(data, weights.astype(float), trim=0.0)
+        assert means == pytest.approx(repeated.mean(axis=0))
+
+
+class TestQuantileSketch:
+    """Tests for QuantileSketch"""
+
+    def test_exact_until_full(self):
+        """A sketch that has not compacted anything is exact"""
+        data = numpy.random.default_rng(1).normal(size=(150, 3))
+        sketch = QuantileSketch(3)
+        sketch.add_batch(data)
+        assert len(sketch.levels) == 1
+        assert sketch.quantiles(QUARTILES).tolist() == (
+            exact_quantiles(data, QUARTILES).tolist()
+        )
+        assert sketch.trimmed_means().tolist() == exact_trimmed_means(data).tolist()
+
+    def test_approximate_in_bounded_memory(self):
+        """Many rows are sketched in a few hundred values per column, within
+        a small rank error"""
+        data = numpy.random.default_rng(2).lognormal(size=(100000, 2))
+        sketch = QuantileSketch(2, seed=3)
+        for start in range(0, len(data), 1000):
+            sketch.add_batch(data[start : start + 1000])
+        assert sketch.count == len(data)
+        assert sum(map(len, sketch.levels)) < 3 * sketch.size
+        errors = ranks(data, sketch.quantiles(QUARTILES)) - [[q] for q in QUARTILES]
+        assert abs(errors).max() < 0.02
+        assert sketch.trimmed_means() == pytest.approx(
+            exact_trimmed_means(data), rel=0.02
+        )
+
+    def test_merge_shards(self):
+        """Merged sketches of shards approximate the quantiles of all rows"""
+        data = numpy.random.default_rng(4).normal(size=(30000, 1))
+        sketches = [QuantileSketch(1, seed=seed) for seed in range(3)]
+        for sketch, shard in zip(sketches, numpy.split(data, 3), strict=True):
+            sketch.add_batch(shard)
+        merged, *others = sketches
+        for other in others:
+            merged.merge(other)
+        assert merged.count == len(data)
+        median = merged.quantiles([0.5])
+        assert abs(ranks(data, median)[0, 0] - 0.5) < 0.02
+
+    def test_merge_different_columns(self):
+        """Only sketches of the same columns can be merged"""
+        with pytest.raises(ValueError):
+            QuantileSketch(2).merge(QuantileSketch(3))
@@ -2,12 +2,23 @@
 
 from io import StringIO
 
+import numpy
 import pytest
 
 from rational_recipes.errors import InvalidInputException
 from rational_recipes.ingredient import Factory
-from rational_recipes.read import parse_file_contents, read_files, value_and_unit
-from rational_recipes.units import CUP, GRAM, METRIC_CUP
+from rational_recipes.read import (
+    clear_measure_cache,
+    measure_cache_info,
+    parse_file_contents,
+    read_files,
+    read_measure_files,
+    read_measures,
+    stream_files,
+    unit_spellings,
+    value_and_unit,
+)
+from rational_recipes.units import CUP, GRAM, METRIC_CUP, OZ, US_FLOZ
 from tests.test_utils import normalize
 
 FLOUR = Factory.get_by_name("flour")
@@ -44,6 +55,92 @@ class TestReadFiles:
         assert str(exc_info.value) == "All input files must have the same header."
 
 
+class TestReadMeasures:
+    """Unit tests for the columnar reader"""
+
+    def test_values_and_unit_codes(self):
+        """Values and unit codes are read into matching matrices"""
+        input_file = StringIO("Flour, Sugar\n1 cup,2g\n\n7oz,0")
+        ingredients, measures = read_measures([input_file])
+        assert (FLOUR, SUGAR) == ingredients
+        assert measures.values.tolist() == [[1.0, 2.0], [7.0, 0.0]]
+        assert measures.units.tolist() == [
+            [CUP.code, GRAM.code],
+            [OZ.code, GRAM.code],
+        ]
+
+    def test_two_files_concatenated(self):
+        """Rows from several files are concatenated in order"""
+        input_file_1 = StringIO("Flour, Sugar\n1g,2g")
+        input_file_2 = StringIO("Flour, Sugar\n3g,4g\n5g,6g")
+        _, measures = read_measures([input_file_1, input_file_2])
+        assert len(measures) == 3
+        assert measures.values[:, 0].tolist() == [1.0, 3.0, 5.0]
+
+    def test_non_matching_headers(self):
+        """Files with differing ingredients are rejected"""
+        input_file_1 = StringIO("Flour, Sugar\n1g,2g")
+        input_file_2 = StringIO("Flour, Salt\n1g,2g")
+        with pytest.raises(InvalidInputException) as exc_info:
+            read_measures([input_file_1, input_file_2])
+        assert str(exc_info.value) == "All input files must have the same header."
+
+    def test_missing_input_column(self):
+        """Row length errors report the same line as the row reader"""
+        input_file = StringIO("Flour, Sugar\n1g,2g\n3g")
+        with pytest.raises(InvalidInputException) as exc_info:
+            read_measures([input_file])
+        assert str(exc_info.value) == (
+            "The row on line 3 has 1 columns where 2 were expected"
+        )
+
+
+class TestReadMeasureFiles:
+    """Unit tests for reading input files by name, optionally in parallel"""
+
+    FILES = [
+        "sample_input/crepes/french_recipe_crepes.csv",
+        "sample_input/crepes/english_recipe_crepes.csv",
+        "sample_input/crepes/ruhlman_crepes.csv",
+    ]
+
+    def test_parallel_matches_sequential(self):
+        """Worker processes give the same ingredients and row order"""
+        ingredients, expected = read_measure_files(self.FILES)
+        parallel_ingredients, measures = read_measure_files(self.FILES, jobs=2)
+        assert parallel_ingredients == ingredients
+        numpy.testing.assert_array_equal(measures.values, expected.values)
+        numpy.testing.assert_array_equal(measures.units, expected.units)
+
+    def test_parallel_non_matching_headers(self):
+        """Header mismatches are reported from worker results as well"""
+        with pytest.raises(InvalidInputException) as exc_info:
+            read_measure_files([self.FILES[0], "sample_input/crumble.csv"], jobs=2)
+        assert str(exc_info.value) == "All input files must have the same header."
+
+
+class TestStreamFiles:
+    """Unit tests for line by line reading of input files"""
+
+    def test_rows_match_read_files(self):
+        """Streamed rows are the same as those read all at once"""
+        contents = "Flour, Sugar\n1g,2 cups\n\n3 oz,0\n"
+        _, expected = read_files([StringIO(contents)])
+        ingredients, rows = stream_files([StringIO(contents), StringIO(contents)])
+        assert (FLOUR, SUGAR) == ingredients
+        assert list(rows) == expected + expected
+
+    def test_non_matching_headers(self):
+        """A differing header is reported when the stream reaches it"""
+        input_file_1 = StringIO("Flour, Sugar\n1g,2g")
+        input_file_2 = StringIO("Flour, Salt\n1g,2g")
+        _, rows = stream_files([input_file_1, input_file_2])
+        assert next(rows) == [(1.0, GRAM), (2.0, GRAM)]
+        with pytest.raises(InvalidInputException) as exc_info:
+            next(rows)
+        assert str(exc_info.value) == "All input files must have the same header."
+
+
 class TestReadProportions:
     """Test parsing of proportions from input file"""
 
@@ -164,3 +261,58 @@ class TestReadMeasure:
         with pytest.raises(InvalidInputException) as exc_info:
             _value, _unit = parse_measure("1 blah")
         assert str(exc_info.value) == "No unit named 'blah' at line 1, column 1"
+
+
+class TestMeasureCache:
+    """Test memoisation of parsed measure tokens"""
+
+    def test_repeated_measure_hits_cache(self):
+        """A repeated token is parsed once and then served from the cache"""
+        clear_measure_cache()
+        first = parse_measure("3 cups")
+        second = value_and_unit(line_nr=7, column_index=2, measure="3 cups")
+        assert first == second == (3.0, CUP)
+        info = measure_cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+
+    def test_errors_keep_position_on_repeat(self):
+        """Failed parses are not cached and report each cell's position"""
+        clear_measure_cache()
+        for line_nr in (2, 3):
+            with pytest.raises(InvalidInputException) as exc_info:
+                value_and_unit(line_nr=line_nr, column_index=4, measure="1 blah")
+            assert str(exc_info.value) == (
+                f"No unit named 'blah' at line {line_nr}, column 4"
+            )
+        assert measure_cache_info().currsize == 0
+
+
+class TestUnitSpellings:
+    """Test parsing of measures through the table of unit spellings"""
+
+    def test_spellings(self):
+        """Common spellings of registered names map to their units"""
+        spellings = unit_spellings()
+        assert spellings["cups"] is spellings["CUPS"] is spellings["Cups"] is CUP
+        assert spellings["US fluid ounce"] is spellings["us fluid ounce"] is US_FLOZ
+
+    @pytest.mark.parametrize(
+        "measure,expected",
+        [
+            ("2 CuP", (2.0, CUP)),
+            ("1.5cups.", (1.5, CUP)),
+            ("3 fl oz", (3.0, US_FLOZ)),
+            ("0.5", (0, GRAM)),
+            ("0", (0, GRAM)),
+        ],
+    )
+    def test_parse_measure(self, measure, expected):
+        """Other spellings and zeros parse as with the general pattern"""
+        clear_measure_cache()
+        assert parse_measure(measure) == expected
+
+    def test_trailing_text(self):
+        """Unit text followed by more words is still rejected"""
+        with pytest.raises(InvalidInputException) as exc_info:
+            value_and_unit(line_nr=2, column_index=0, measure="1 cup flour")
+        assert str(exc_info.value) == "No unit named 'cup flour' at line 2, column 0"
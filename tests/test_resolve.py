@@ -0,0 +1,71 @@
+"""Tests for asynchronous ingredient lookups"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from rational_recipes.ingredient import Factory
+from rational_recipes.resolve import resolve_ingredient, resolve_many
+
+FLOUR = Factory.get_by_name("flour")
+
+
+@pytest.fixture
+def loads(monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """Start from an empty ingredient cache and record the batches loaded"""
+    monkeypatch.setattr(Factory, "_INGREDIENTS", {})
+    monkeypatch.setattr(Factory, "_RECENT", OrderedDict())
+    monkeypatch.setattr(Factory, "_PINNED", set())
+    batches: list[list[str]] = []
+    get_many = Factory.get_many
+
+    def record(names):
+        assert threading.current_thread() is not threading.main_thread()
+        batches.append(list(names))
+        return get_many(names)
+
+    monkeypatch.setattr(Factory, "get_many", record)
+    return batches
+
+
+class TestResolve:
+    """Tests for resolve_ingredient and resolve_many"""
+
+    def test_same_instances(self) -> None:
+        """Async lookups return the cached instances"""
+        assert asyncio.run(resolve_ingredient(" Flour")) is FLOUR
+        ingredients = asyncio.run(resolve_many(["flour", "egg", "FLOUR"]))
+        assert ingredients == (FLOUR, Factory.get_by_name("egg"), FLOUR)
+
+    def test_concurrent_lookups_coalesce(self, loads: list[list[str]]) -> None:
+        """Concurrent lookups of a name share one load on a worker thread"""
+
+        async def lookups():
+            return await asyncio.gather(
+                resolve_many(["nutmeg", "oats"]),
+                *(resolve_ingredient("Nutmeg") for _ in range(10)),
+                resolve_many(["oats", "molasses"]),
+            )
+
+        first, *nutmegs, last = asyncio.run(lookups())
+        nutmeg, oats = first
+        assert all(ingredient is nutmeg for ingredient in nutmegs)
+        assert last == (oats, Factory.get_by_name("molasses"))
+        assert loads == [["nutmeg", "oats"], ["molasses"]]
+
+    def test_unknown_name(self, loads: list[list[str]]) -> None:
+        """Unknown names raise KeyError without failing other callers"""
+
+        async def lookups():
+            return await asyncio.gather(
+                resolve_many(["oats", "no_such_ingredient_xyz"]),
+                resolve_ingredient("oats"),
+                return_exceptions=True,
+            )
+
+        error, oats = asyncio.run(lookups())
+        assert isinstance(error, KeyError)
+        assert error.args[0] == "no_such_ingredient_xyz"
+        assert oats is Factory.get_by_name("oats")
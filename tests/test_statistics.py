@@ -1,21 +1,38 @@
 """Direct unit tests for statistics module"""
 
 import math
+import tracemalloc
 
 import numpy
 import pytest
 
+from rational_recipes.errors import InvalidArgumentException, InvalidInputException
 from rational_recipes.ingredient import Ingredient
+from rational_recipes.output import Output
+from rational_recipes.quantiles import SKETCH_SEED
 from rational_recipes.statistics import (
+    BOOTSTRAP_BLOCK_CELLS,
     Z_VALUE,
+    RobustStatistics,
     Statistics,
+    StatsAccumulator,
+    batch_statistics,
+    bootstrap_bounds,
     calculate_confidence_intervals,
     calculate_minimum_sample_sizes,
     calculate_statistics,
     calculate_variables,
+    column_moments,
+    confidence_intervals,
     create_zero_filter,
+    effective_sample_size,
     filter_zero_columns,
     filter_zeros,
+    impute_zeros,
+    minimum_sample_sizes,
+    pack_datasets,
+    robust_statistics,
+    statistics_buffer,
 )
 
 
@@ -88,6 +105,49 @@ class TestCalculateVariables:
         assert intervals[0] == pytest.approx(expected_interval)
 
 
+class TestArrayKernels:
+    """Tests for the array statistics functions"""
+
+    def test_column_moments(self):
+        """Means and standard deviations are calculated per column"""
+        data = numpy.array([[50.0, 50.0], [60.0, 40.0], [70.0, 30.0]])
+        means, stds = column_moments(data)
+        numpy.testing.assert_allclose(means, [60.0, 40.0])
+        numpy.testing.assert_allclose(stds, [data[:, 0].std()] * 2)
+
+    def test_confidence_intervals(self):
+        """Intervals agree with the list based calculation"""
+        columns = [numpy.array([1.0, 2.0, 4.0]), numpy.array([3.0, 5.0])]
+        stds = [column.std() for column in columns]
+        intervals = confidence_intervals(numpy.array(stds), numpy.array([3, 2]))
+        numpy.testing.assert_allclose(
+            intervals, calculate_confidence_intervals(columns, stds)
+        )
+
+    def test_minimum_sample_sizes(self):
+        """Sample sizes agree with the scalar formula, and zero means give 0"""
+        sizes = minimum_sample_sizes(
+            numpy.array([10.0, 5.0]), numpy.array([50.0, 0.0]), 0.05
+        )
+        assert sizes.tolist() == [62, 0]
+
+    def test_matrix_variables(self):
+        """calculate_variables gives the same result for a matrix"""
+        data = numpy.array([[10.0, 20.0, 30.0], [1.0, 5.0, 6.0]])
+        matrix_result = calculate_variables(data)
+        list_result = calculate_variables(list(data))
+        for matrix_values, list_values in zip(matrix_result, list_result, strict=True):
+            numpy.testing.assert_allclose(matrix_values, list_values)
+
+    def test_array_input_not_modified(self):
+        """Statistics of an array leave the array as it was"""
+        ingredients = [make_ingredient("stat_m"), make_ingredient("stat_n")]
+        raw_data = numpy.array([[100.0, 100.0], [30.0, 10.0]])
+        stats = calculate_statistics(raw_data, ingredients, None)
+        assert stats.means == pytest.approx([62.5, 37.5])
+        assert raw_data.tolist() == [[100.0, 100.0], [30.0, 10.0]]
+
+
 class TestCalculateStatistics:
     """Tests for calculate_statistics end-to-end"""
 
@@ -142,6 +202,211 @@ class TestCalculateStatistics:
             assert a == pytest.approx(b)
 
 
+class TestBootstrapBounds:
+    """Tests for bootstrap_bounds and bootstrap intervals in Statistics"""
+
+    def test_reproducible_with_seed(self):
+        """The same seed gives the same bounds, also with several jobs,
+        weighted or not"""
+        rng = numpy.random.default_rng(1)
+        data = rng.normal(50, 10, (20000, 2))
+        for weights in (None, rng.random(20000)):
+            lower, upper = bootstrap_bounds(data, 300, seed=7, weights=weights)
+            for jobs in (2, 4):
+                again_lower, again_upper = bootstrap_bounds(
+                    data, 300, seed=7, jobs=jobs, weights=weights
+                )
+                assert list(lower) == list(again_lower)
+                assert list(upper) == list(again_upper)
+
+    def test_memory_bounded_by_data(self):
+        """Resamples are drawn in blocks, so peak memory does not grow with
+        resamples times rows"""
+        data = numpy.random.default_rng(3).random((20000, 10))
+        tracemalloc.start()
+        try:
+            bootstrap_bounds(data, 1000, seed=1)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 32 * BOOTSTRAP_BLOCK_CELLS + 4 * data.nbytes
+
+    def test_close_to_normal_interval(self):
+        """With many normal rows the bounds approach mean +- Z * sem"""
+        data = numpy.random.default_rng(2).normal(50, 10, (2000, 1))
+        lower, upper = bootstrap_bounds(data, 2000, seed=3)
+        mean = data.mean()
+        sem = data.std() / math.sqrt(len(data))
+        assert lower[0] == pytest.approx(mean - Z_VALUE * sem, abs=0.1 * sem)
+        assert upper[0] == pytest.approx(mean + Z_VALUE * sem, abs=0.1 * sem)
+
+    def test_skewed_column_is_asymmetric(self):
+        """A rarely used ingredient gets a longer interval above its mean,
+        and never one below zero"""
+        ingredients = [make_ingredient("stat_boot_a"), make_ingredient("stat_boot_b")]
+        raw_data = [(99, 1)] * 2 + [(100, 0)] * 38
+        stats = calculate_statistics(raw_data, ingredients, None, 2000, seed=5)
+        assert stats.bounds is not None
+        below, above = stats.interval_widths()[1]
+        assert above > below
+        assert stats.bounds[1][0] >= 0
+
+    def test_normal_widths_without_bootstrap(self):
+        """Without resamples the widths are the symmetric intervals"""
+        ingredients = [make_ingredient("stat_boot_c"), make_ingredient("stat_boot_d")]
+        stats = calculate_statistics([(50, 50), (60, 40)], ingredients, None)
+        assert stats.bounds is None
+        assert stats.interval_widths() == [
+            (interval, interval) for interval in stats.intervals
+        ]
+
+
+class TestRobustStatistics:
+    """Tests for robust_statistics and robust statistics in Statistics"""
+
+    def test_outlier(self):
+        """An outlier moves the mean but hardly the median"""
+        data = numpy.array([[10.0], [11.0], [12.0], [13.0], [1000.0]])
+        robust = robust_statistics(data)
+        assert robust.medians == [12.0]
+        assert robust.lower_quartiles == [11.0]
+        assert robust.upper_quartiles == [13.0]
+
+    def test_calculate_statistics(self):
+        """Robust statistics are calculated on the normalized rows"""
+        ingredients = [make_ingredient("stat_rob_a"), make_ingredient("stat_rob_b")]
+        raw_data = [(1, 1), (3, 1), (1, 3)]
+        assert calculate_statistics(raw_data, ingredients, None).robust is None
+        stats = calculate_statistics(raw_data, ingredients, None, robust=True)
+        assert stats.robust is not None
+        assert stats.robust.medians == [50.0, 50.0]
+        assert stats.robust.trimmed_means == pytest.approx(stats.means)
+
+    def test_printed(self):
+        """Each ingredient gets a line with its median"""
+        stats = Statistics([make_ingredient("stat_rob_c")], [0.0], [0.0], [100.0])
+        output = Output()
+        stats.print_robust_statistics(output)
+        assert str(output) == ""
+        stats.robust = RobustStatistics([50.0], [40.0], [60.0], [51.0])
+        stats.print_robust_statistics(output)
+        assert "median of 50.00%" in str(output)
+        assert "interquartile range 40.00% to 60.00%" in str(output)
+
+
+class TestWeightedStatistics:
+    """Tests for calculate_statistics with row weights"""
+
+    ingredients = (make_ingredient("stat_w_a"), make_ingredient("stat_w_b"))
+    rows = numpy.array([[50.0, 50.0], [60.0, 40.0], [75.0, 25.0], [90.0, 10.0]])
+
+    def test_unit_weights(self):
+        """Equal weights give the unweighted statistics"""
+        expected = calculate_statistics(self.rows, self.ingredients, None)
+        stats = calculate_statistics(
+            self.rows, self.ingredients, None, weights=[2.0] * 4
+        )
+        assert stats.means == pytest.approx(expected.means)
+        assert stats.std_deviations == pytest.approx(expected.std_deviations)
+        assert stats.intervals == pytest.approx(expected.intervals)
+        assert stats.effective_sample_size == pytest.approx(4)
+        assert expected.effective_sample_size is None
+
+    def test_unit_weights_robust(self):
+        """Equal weights give the unweighted robust statistics"""
+        for data in ([[1.0], [2.0], [3.0], [4.0]], [[1.0], [2.0], [9.0]]):
+            expected = robust_statistics(numpy.array(data))
+            robust = robust_statistics(numpy.array(data), numpy.ones(len(data)))
+            assert robust.medians == pytest.approx(expected.medians)
+            assert robust.lower_quartiles == pytest.approx(expected.lower_quartiles)
+            assert robust.upper_quartiles == pytest.approx(expected.upper_quartiles)
+            assert robust.trimmed_means == pytest.approx(expected.trimmed_means)
+        assert expected.trimmed_means == [4.0]
+
+    def test_integer_weights(self):
+        """Integer weights repeat rows, but do not add information"""
+        weights = [1, 3, 2, 1]
+        repeated = numpy.repeat(self.rows, weights, axis=0)
+        expected = calculate_statistics(repeated, self.ingredients, None)
+        stats = calculate_statistics(self.rows, self.ingredients, None, weights=weights)
+        assert stats.means == pytest.approx(expected.means)
+        assert stats.std_deviations == pytest.approx(expected.std_deviations)
+        sample_size = effective_sample_size(numpy.array(weights, dtype=float))
+        assert sample_size == pytest.approx(49 / 15)
+        assert stats.intervals == pytest.approx(
+            Z_VALUE * numpy.array(stats.std_deviations) / math.sqrt(sample_size)
+        )
+
+    def test_zero_weight_drops_row(self):
+        """A row without weight counts for nothing, also for ignored zeros,
+        bootstrap and robust statistics"""
+        rows = numpy.vstack([self.rows, [[100.0, 0.0], [10.0, 90.0]]])
+        kept = numpy.vstack([self.rows, [[100.0, 0.0]]])
+        expected = calculate_statistics(
+            kept, self.ingredients, ["stat_w_b"], robust=True, weights=[1] * 5
+        )
+        stats = calculate_statistics(
+            rows,
+            self.ingredients,
+            ["stat_w_b"],
+            robust=True,
+            weights=[1, 1, 1, 1, 1, 0],
+        )
+        assert stats.means == pytest.approx(expected.means)
+        assert stats.intervals == pytest.approx(expected.intervals)
+        assert stats.robust is not None and expected.robust is not None
+        assert stats.robust.medians == pytest.approx(expected.robust.medians)
+        assert stats.robust.trimmed_means == pytest.approx(
+            expected.robust.trimmed_means
+        )
+        bootstrapped = calculate_statistics(
+            rows, self.ingredients, None, 500, seed=1, weights=[1, 1, 1, 1, 1, 0]
+        )
+        assert bootstrapped.bounds is not None
+        assert bootstrapped.bounds[0][0] > 50.0
+
+    def test_invalid_weights(self):
+        """Weights must match the rows and not be negative"""
+        for weights in ([1.0, 1.0], [1.0, -1.0, 1.0, 1.0], [0.0] * 4):
+            with pytest.raises(InvalidArgumentException):
+                calculate_statistics(self.rows, self.ingredients, None, weights=weights)
+
+
+class TestStatisticsBuffer:
+    """Tests for the column-major buffer of calculate_statistics"""
+
+    ingredients = (make_ingredient("stat_buf_a"), make_ingredient("stat_buf_b"))
+
+    def test_buffer_layout(self):
+        """Rows are copied into a column-major matrix of the given type"""
+        rows = [(1, 2), (3, 4), (5, 6)]
+        buffer = statistics_buffer(zip(*zip(*rows, strict=True), strict=True))
+        assert buffer.flags.f_contiguous
+        assert buffer.dtype == numpy.float64
+        assert buffer.tolist() == [[1, 2], [3, 4], [5, 6]]
+        assert statistics_buffer(rows, numpy.float32).dtype == numpy.float32
+
+    def test_float32(self):
+        """Single precision gives the double precision statistics"""
+        rows = numpy.random.default_rng(9).random((100000, 2)) * [100, 1]
+        expected = calculate_statistics(rows, self.ingredients, None)
+        stats = calculate_statistics(
+            rows, self.ingredients, None, robust=True, dtype=numpy.float32
+        )
+        assert stats.means == pytest.approx(expected.means, rel=1e-6)
+        assert stats.std_deviations == pytest.approx(expected.std_deviations, rel=1e-6)
+        assert stats.intervals == pytest.approx(expected.intervals, rel=1e-6)
+
+    def test_copy(self):
+        """Without copy, a column-major matrix is normalized in place"""
+        rows = numpy.array([[1.0, 3.0], [2.0, 2.0]], order="F")
+        calculate_statistics(rows, self.ingredients, None)
+        assert rows.tolist() == [[1.0, 3.0], [2.0, 2.0]]
+        stats = calculate_statistics(rows, self.ingredients, None, copy=False)
+        assert rows.tolist() == [[25.0, 75.0], [50.0, 50.0]]
+        assert stats.means == [37.5, 62.5]
+
+
 class TestBakersPercentage:
     """Tests for Statistics.bakers_percentage"""
 
@@ -198,6 +463,123 @@ class TestStatisticsDefaults:
         assert stats.desired_interval == pytest.approx(0.10)
 
 
+class TestStatsAccumulator:
+    """Tests for running statistics over normalized rows"""
+
+    def test_matches_calculate_statistics(self):
+        """Row by row accumulation gives the same statistics"""
+        ingredients = [make_ingredient("acc_a"), make_ingredient("acc_b")]
+        raw_data = [(50, 50), (60, 40), (75, 25), (90, 10)]
+        expected = calculate_statistics(raw_data, ingredients, None)
+        accumulator = StatsAccumulator(2)
+        for row in raw_data:
+            accumulator.add(row)
+        stats = accumulator.statistics(ingredients)
+        assert accumulator.count == 4
+        assert stats.means == pytest.approx(expected.means)
+        assert stats.std_deviations == pytest.approx(expected.std_deviations)
+        assert stats.intervals == pytest.approx(expected.intervals)
+
+    def test_batches_and_merged_shards(self):
+        """Batches and merged shards give the same statistics as all rows"""
+        ingredients = [make_ingredient("acc_c"), make_ingredient("acc_d")]
+        rng = numpy.random.default_rng(5)
+        rows = rng.random((100, 2)) * 100
+        rows[:, 1] = 100 - rows[:, 0]
+        expected = calculate_statistics(rows, ingredients, None)
+        shards = []
+        for shard in numpy.array_split(rows, 3):
+            accumulator = StatsAccumulator(2)
+            accumulator.add_batch(shard[:20])
+            for row in shard[20:]:
+                accumulator.add(row)
+            shards.append(accumulator)
+        combined = StatsAccumulator(2)
+        combined.add_batch(rows[:0])
+        for accumulator in shards:
+            combined.merge(accumulator)
+        combined.merge(StatsAccumulator(2))
+        stats = combined.statistics(ingredients)
+        assert combined.count == 100
+        assert stats.means == pytest.approx(expected.means)
+        assert stats.std_deviations == pytest.approx(expected.std_deviations)
+        assert stats.intervals == pytest.approx(expected.intervals)
+
+    def test_robust_sketch(self):
+        """Merged shards with sketches give the robust statistics of all rows,
+        exactly while the rows fit in the sketch"""
+        ingredients = [make_ingredient("acc_e"), make_ingredient("acc_f")]
+        rows = numpy.random.default_rng(6).random((120, 2)) * 100
+        rows[:, 1] = 100 - rows[:, 0]
+        expected = calculate_statistics(rows, ingredients, None, robust=True)
+        combined = StatsAccumulator(2, robust=True)
+        for shard in numpy.array_split(rows, 3):
+            accumulator = StatsAccumulator(2, robust=True)
+            accumulator.add_batch(shard)
+            combined.merge(accumulator)
+        robust = combined.statistics(ingredients).robust
+        assert expected.robust is not None and robust is not None
+        assert robust.medians == expected.robust.medians
+        assert robust.lower_quartiles == expected.robust.lower_quartiles
+        assert robust.upper_quartiles == expected.robust.upper_quartiles
+        assert robust.trimmed_means == pytest.approx(expected.robust.trimmed_means)
+        other = StatsAccumulator(2)
+        other.add_batch(rows)
+        with pytest.raises(ValueError):
+            combined.merge(other)
+
+    def test_robust_sketch_is_reproducible(self):
+        """Sketches that compact give the same statistics on every run,
+        unless seeded differently"""
+        ingredients = [make_ingredient("acc_g"), make_ingredient("acc_h")]
+        rows = numpy.random.default_rng(7).random((5000, 2)) * 100
+
+        def medians(seed=None):
+            accumulator = StatsAccumulator(2, robust=True, seed=seed)
+            accumulator.add_batch(rows)
+            robust = accumulator.statistics(ingredients).robust
+            assert robust is not None
+            return robust.medians
+
+        assert medians() == medians() == medians(SKETCH_SEED)
+        assert medians(1) == medians(1)
+        assert medians(1) != medians()
+
+
+class TestBatchStatistics:
+    """Tests for pack_datasets and batch_statistics"""
+
+    def test_matches_calculate_statistics(self):
+        """Each packed data set gets the statistics it gets on its own"""
+        rng = numpy.random.default_rng(7)
+        datasets = [
+            rng.random((rows, columns))
+            for rows, columns in [(5, 3), (1, 2), (12, 6), (2, 1)]
+        ]
+        batch = batch_statistics(*pack_datasets(datasets), desired_interval=0.1)
+        assert batch.sample_sizes.tolist() == [5, 1, 12, 2]
+        for i, dataset in enumerate(datasets):
+            ingredients = tuple(
+                make_ingredient(f"batch_{i}_{j}") for j in range(dataset.shape[1])
+            )
+            expected = calculate_statistics(dataset, ingredients, None)
+            stats = batch.statistics(i, ingredients)
+            assert stats.ingredients == ingredients
+            assert stats.means == pytest.approx(expected.means)
+            assert stats.std_deviations == pytest.approx(expected.std_deviations)
+            assert stats.intervals == pytest.approx(expected.intervals)
+            sizes = calculate_minimum_sample_sizes(
+                expected.std_deviations, expected.means, 0.1
+            )
+            assert batch.min_sample_sizes[batch.columns(i)].tolist() == list(sizes)
+
+    def test_zero_row(self):
+        """A recipe without any ingredients cannot be normalized"""
+        datasets = [numpy.ones((2, 2)), numpy.array([[1.0, 1.0], [0.0, 0.0]])]
+        with pytest.raises(ZeroDivisionError):
+            batch_statistics(*pack_datasets(datasets))
+
+
 class TestCreateZeroFilter:
     """Tests for create_zero_filter"""
 
@@ -257,3 +639,41 @@ class TestFilterZeroColumns:
             assert sum(row) == pytest.approx(100.0, abs=1e-5)
             for val in row:
                 assert val > 0.0
+
+    def test_all_zero_column(self):
+        """A column without other values cannot have its zeros ignored"""
+        ingredients = [make_ingredient("fzc_e"), make_ingredient("fzc_f")]
+        raw_data = [(0, 40), (0, 100)]
+        with pytest.raises(InvalidInputException):
+            filter_zero_columns(raw_data, ingredients, ["fzc_e"])
+
+
+class TestImputeZeros:
+    """Tests for impute_zeros"""
+
+    @staticmethod
+    def row_by_row(data, defaults, filter_map):
+        """Reference implementation, one row at a time"""
+        total = sum(defaults)
+        percentages = [default / total for default in defaults]
+        result = []
+        for original_row in data:
+            row = list(original_row)
+            for i in range(len(row)):
+                if filter_map[i] and row[i] == 0:
+                    row = [column - (column * percentages[i]) for column in row]
+            for i in range(len(row)):
+                if filter_map[i] and row[i] == 0:
+                    row[i] = percentages[i] * 100
+            result.append(row)
+        return result
+
+    def test_matches_row_by_row(self):
+        """Masked imputation gives exactly the row by row result"""
+        rng = numpy.random.default_rng(3)
+        data = rng.random((50, 6)) * (rng.random((50, 6)) > 0.4)
+        defaults = list(rng.random(6))
+        filter_map = {0: True, 1: False, 2: True, 3: True, 4: False, 5: True}
+        expected = self.row_by_row(data.tolist(), defaults, filter_map)
+        impute_zeros(data, defaults, filter_map)
+        assert data.tolist() == expected
@@ -1,9 +1,11 @@
 """Unit tests for stats script"""
 
+import numpy
 import pytest
 
 import rational_recipes.utils as utils
 from rational_recipes import StatsMain
+from rational_recipes.errors import InvalidArgumentException, InvalidInputException
 from tests.test_utils import verify_output
 
 EXPECTED_OUTPUT = """
@@ -137,3 +139,95 @@ class TestStats:
         expected = [105, 212, 86, 18]
         for actual, exp in zip(result.recipe_weights, expected, strict=False):
             assert actual == pytest.approx(exp, abs=1)
+
+    def test_stream_matches_in_memory(self):
+        """Streaming mode gives the same statistics as reading into memory"""
+        merge = utils.parse_column_merge("milk+water:flour+salt")
+        in_memory = StatsMain(["tests/test.csv"], False, merge, [])
+        streamed = StatsMain(["tests/test.csv"], False, merge, [], stream=True)
+        assert streamed.sample_size == in_memory.sample_size
+        assert streamed.stats.means == pytest.approx(in_memory.stats.means)
+        assert streamed.stats.intervals == pytest.approx(in_memory.stats.intervals)
+
+    def test_bootstrap_intervals(self):
+        """Bootstrap intervals are reproducible with a seed and are printed"""
+        first = StatsMain(["tests/test.csv"], True, [], [], bootstrap=500, seed=1)
+        second = StatsMain(["tests/test.csv"], True, [], [], bootstrap=500, seed=1)
+        assert first.stats.bounds == second.stats.bounds
+        assert "bootstrap confidence intervals" in first.main(2, 0, 1000, True).output
+
+    def test_robust_statistics(self):
+        """Robust statistics are printed, and approximated when streaming"""
+        in_memory = StatsMain(["tests/test.csv"], False, [], [], robust=True)
+        streamed = StatsMain(["tests/test.csv"], False, [], [], True, robust=True)
+        result = in_memory.main(2, 0, 1000, False)
+        assert "has a median of" in result.output
+        assert result.robust == in_memory.stats.robust
+        assert streamed.stats.robust is not None
+        assert streamed.stats.robust.medians == pytest.approx(result.robust.medians)
+
+    def test_source_weights(self):
+        """Recipes are weighted by their input file, and distinct recipes
+        keep their largest weight"""
+        files = ["tests/test.csv", "tests/test.csv"]
+        unweighted = StatsMain(files[:1], True, [], [])
+        weighted = StatsMain(files, True, [], [], source_weights=[0.5, 2.0])
+        assert weighted.sample_size == unweighted.sample_size
+        assert weighted.stats.means == pytest.approx(unweighted.stats.means)
+        assert weighted.stats.effective_sample_size == pytest.approx(
+            unweighted.sample_size
+        )
+        assert "effective sample size of 119.0" in str(weighted.main(2, 0, 100, False))
+        with pytest.raises(InvalidArgumentException):
+            StatsMain(files, True, [], [], source_weights=[1.0])
+        with pytest.raises(InvalidArgumentException):
+            StatsMain(files, False, [], [], stream=True, source_weights=[1.0, 1.0])
+
+    def test_distinct_rows_keep_largest_weight(self):
+        """Duplicate rows collapse into one with the largest weight"""
+        matrix = numpy.array([[1.0, 2.0], [3.0, 4.0], [1.0, 2.0]])
+        rows, weights = utils.distinct_rows(matrix, numpy.array([0.5, 1.0, 2.0]))
+        assert rows.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+        assert weights is not None
+        assert weights.tolist() == [2.0, 1.0]
+        assert utils.distinct_rows(matrix)[1] is None
+
+    def test_float32(self):
+        """Single precision gives the same output"""
+        merge = utils.parse_column_merge("milk+water:flour+salt")
+        expected = StatsMain(["tests/test.csv"], True, merge, ["butter"])
+        stats = StatsMain(["tests/test.csv"], True, merge, ["butter"], float32=True)
+        assert stats.sample_size == expected.sample_size
+        assert str(stats.main(2, 0, 100, True)) == str(expected.main(2, 0, 100, True))
+
+    def test_read_proportions_buffer(self):
+        """Input files are read into one column-major matrix"""
+        _, grams, weights = utils.read_proportions(
+            ["tests/test.csv"] * 2, False, [], dtype=numpy.float32
+        )
+        assert grams.dtype == numpy.float32
+        assert grams.flags.f_contiguous
+        assert weights is None
+
+    def test_distinct_before_float32(self, tmp_path):
+        """Rows that only differ below single precision stay distinct, and
+        the result is still one column-major matrix"""
+        path = tmp_path / "close.csv"
+        path.write_text("Flour, Sugar\n100g,1g\n100.000001g,1g\n100g,1g\n")
+        _, grams, _ = utils.read_proportions([str(path)], True, [], dtype=numpy.float32)
+        assert grams.dtype == numpy.float32
+        assert grams.flags.f_contiguous
+        assert len(grams) == 2
+
+    def test_no_recipes(self, tmp_path):
+        """Input files with only a header are reported, streamed or not"""
+        path = tmp_path / "empty.csv"
+        path.write_text("Flour, Sugar\n")
+        for stream in (False, True):
+            with pytest.raises(InvalidInputException, match="No recipes in input"):
+                StatsMain([str(path)], not stream, [], [], stream)
+
+    def test_stream_rejects_distinct(self):
+        """Duplicates cannot be removed without holding all rows"""
+        with pytest.raises(InvalidArgumentException):
+            StatsMain(["tests/test.csv"], True, [], [], stream=True)
@@ -0,0 +1,84 @@
+"""Tests for the recipe collection stopping rule"""
+
+import numpy
+import pytest
+
+from rational_recipes.errors import InvalidInputException
+from rational_recipes.ingredient import Factory
+from rational_recipes.statistics import calculate_minimum_sample_sizes
+from rational_recipes.stopping import StoppingRule
+
+INGREDIENTS = tuple(
+    Factory.get_by_name(name) for name in ("flour", "milk", "egg", "salt")
+)
+
+
+def recipes(count, seed=0):
+    """Random recipes in grams, with little salt"""
+    rng = numpy.random.default_rng(seed)
+    return rng.normal([200, 400, 100, 2], [20, 40, 30, 1], (count, 4)).clip(0.1)
+
+
+class TestStoppingRule:
+    """Tests for StoppingRule"""
+
+    def test_report_matches_statistics(self):
+        """Relative intervals and samples needed follow calculate_statistics"""
+        rule = StoppingRule(INGREDIENTS, desired_interval=0.02)
+        for row in recipes(50):
+            report = rule.add(row)
+        stats = rule.accumulator.statistics(INGREDIENTS)
+        assert report.sample_size == 50
+        expected = [i / m for i, m in zip(stats.intervals, stats.means, strict=True)]
+        assert report.relative_intervals == pytest.approx(expected)
+        sizes = calculate_minimum_sample_sizes(stats.std_deviations, stats.means, 0.02)
+        assert report.samples_needed == [max(size - 50, 0) for size in sizes]
+
+    def test_converges_on_dominant_ingredients(self):
+        """Collection stops on flour, milk and egg without waiting for salt"""
+        rule = StoppingRule(INGREDIENTS)
+        for row in recipes(2000):
+            report = rule.add(row)
+            if report.converged:
+                break
+        assert report.converged
+        assert report.dominant == [0, 1, 2]
+        assert max(report.relative_intervals[:3]) <= 0.05
+        assert report.relative_intervals[3] > 0.05
+        assert report.samples_needed[:3] == [0, 0, 0]
+        assert report.samples_needed[3] > 0
+
+    def test_largest_ingredient_without_dominant_ones(self):
+        """Without an ingredient of DOMINANT_PROPORTION percent, the rule
+        waits for the one with the largest mean"""
+        rule = StoppingRule(INGREDIENTS * 3)
+        rule.add([115] + [100] * 11)
+        report = rule.add([105] + [100] * 11)
+        assert report.dominant == [0]
+        assert report.relative_intervals[0] > 0.05
+        assert not report.converged
+        for _ in range(100):
+            report = rule.add([110] + [100] * 11)
+        assert report.converged
+
+    def test_given_dominant_columns(self):
+        """Dominant ingredients can be given by name or index"""
+        rule = StoppingRule(INGREDIENTS, dominant=["salt", 0])
+        assert rule.dominant == [0, 3]
+        report = rule.report()
+        assert report.sample_size == 0
+        assert not report.converged
+        for row in recipes(200):
+            report = rule.add(row)
+        assert not report.converged
+        with pytest.raises(InvalidInputException):
+            StoppingRule(INGREDIENTS, dominant=["sugar"])
+
+    def test_unused_ingredient(self):
+        """An ingredient missing from every recipe has no interval"""
+        rule = StoppingRule(INGREDIENTS, dominant=["salt"])
+        rule.add([100, 200, 50, 0])
+        report = rule.add([110, 190, 50, 0])
+        assert report.relative_intervals[3] == float("inf")
+        assert report.samples_needed[3] == 0
+        assert not report.converged
@@ -0,0 +1,21 @@
+"""Tests for pools of worker processes"""
+
+from rational_recipes.ingredient import Factory
+from rational_recipes.workers import process_pool
+
+
+def has_connection() -> bool:
+    """True if this process has an ingredient database connection open"""
+    return getattr(Factory._local, "conn", None) is not None
+
+
+class TestProcessPool:
+    """Tests for process_pool"""
+
+    def test_workers_do_not_inherit_connection(self):
+        """Workers open their own database connection instead of sharing
+        the parent's"""
+        Factory.get_by_name("flour")
+        assert has_connection()
+        with process_pool(1) as executor:
+            assert not executor.submit(has_connection).result()